@@ -1,6 +1,6 @@
 {
     'name': 'Gestión Avanzada de Comisiones (Cash Basis & Proyectos)',
-    'version': '19.0.1.1.0',
+    'version': '19.0.1.2.0',
     'category': 'Sales/Commissions',
     'summary': 'Motor de comisiones multi-agente basado en pagos, margenes y liquidaciones.',
     'author': 'Alphaqueb Consulting',
@@ -9,14 +9,23 @@
         'security/security.xml',
         'security/ir.model.access.csv',
         'data/sequence_data.xml',
+        'data/cron_data.xml',
         'views/res_config_settings_views.xml',
         'views/sale_order_views.xml',
         'views/commission_move_views.xml',
         'views/commission_settlement_views.xml',
+        'views/commission_balance_views.xml',
+        'views/commission_move_archive_views.xml',
         'views/commission_authorization_views.xml',
+        'views/commission_queue_views.xml',
+        'views/commission_forecast_report_views.xml',
+        'views/commission_settlement_run_views.xml',
+        'views/commission_recalc_job_views.xml',
+        'views/commission_perf_stat_views.xml',
         'wizard/commission_make_invoice_views.xml',
         'wizard/commission_report_wizard_views.xml',
         'wizard/commission_authorization_reject_wizard_views.xml',
+        'wizard/commission_recalc_wizard_views.xml',
         'report/commission_report_template.xml',
     ],
     'installable': True,
@@ -0,0 +1,31 @@
+import os
+
+from werkzeug.wsgi import wrap_file
+
+from odoo import http
+from odoo.http import content_disposition, request
+
+
+class CommissionDashboardController(http.Controller):
+
+    @http.route('/om_advanced_commission/dashboard', type='jsonrpc', auth='user')
+    def commission_dashboard(self, partner_id=None):
+        """KPIs del comisionista en JSON (el propio usuario, o cualquiera para administradores)."""
+        return request.env['commission.dashboard'].get_dashboard_data(partner_id)
+
+    @http.route('/om_advanced_commission/export/<int:wizard_id>', type='http', auth='user')
+    def commission_export(self, wizard_id):
+        """Descarga la exportación CSV/XLSX del asistente leyendo el archivo temporal por bloques."""
+        wizard = request.env['commission.report.wizard'].browse(wizard_id).exists()
+        if not wizard:
+            return request.not_found()
+        stream, mimetype, filename = wizard._export_stream()
+        size = os.fstat(stream.fileno()).st_size
+        # wrap_file cierra (y así elimina) el archivo temporal al terminar el envío
+        response = request.make_response(wrap_file(request.httprequest.environ, stream), headers=[
+            ('Content-Type', mimetype),
+            ('Content-Length', str(size)),
+            ('Content-Disposition', content_disposition(filename)),
+        ])
+        response.direct_passthrough = True
+        return response
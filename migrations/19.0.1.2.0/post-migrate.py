@@ -0,0 +1,10 @@
+from odoo import api, SUPERUSER_ID
+
+
+def migrate(cr, version):
+    # Llenado inicial de commission.balance: aquí ya existen commission_move y
+    # commission_move_archive, cosa que no ocurre en el init() de cada modelo
+    if not version:
+        return
+    env = api.Environment(cr, SUPERUSER_ID, {})
+    env['commission.balance']._rebuild()
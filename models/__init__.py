@@ -1,7 +1,16 @@
 from . import res_config_settings
 from . import commission_rule
 from . import commission_move
+from . import commission_move_archive
+from . import commission_balance
+from . import commission_dashboard
 from . import commission_settlement
 from . import commission_authorization
 from . import sale_order
-from . import account_move
\ No newline at end of file
+from . import account_move
+from . import commission_queue
+from . import commission_invoice_link
+from . import commission_forecast_report
+from . import commission_settlement_run
+from . import commission_recalc_job
+from . import commission_perf
@@ -1,15 +1,77 @@
 from odoo import models, api, fields
 import logging
 
+from .commission_perf import CommissionProfiler
+from .commission_rate_cache import CommissionRateCache
+
 _logger = logging.getLogger(__name__)
 
 
+# Campos de account.move.line que alteran el índice factura -> SO
+COMMISSION_LINK_LINE_FIELDS = {'sale_line_ids', 'balance', 'debit', 'credit', 'move_id', 'display_type'}
+# Versión del formato de commission.move.snapshot
+COMMISSION_SNAPSHOT_FORMAT = 1
+
+
+class AccountMove(models.Model):
+    _inherit = 'account.move'
+
+    commission_link_indexed = fields.Boolean(
+        string='Indexada para Comisiones', copy=False, readonly=True,
+        help='Indica si el índice factura - orden de venta ya se calculó para esta factura.')
+
+    def _post(self, soft=True):
+        posted = super()._post(soft=soft)
+        posted.filtered(
+            lambda m: m.move_type in ('out_invoice', 'out_refund')
+        )._commission_refresh_sale_links()
+        return posted
+
+    def _commission_refresh_sale_links(self):
+        if not self:
+            return
+        # Un fallo del índice no debe impedir publicar: la factura queda sin
+        # indexar y el motor la indexa al usarla
+        try:
+            with self.env.cr.savepoint():
+                self.env['commission.invoice.sale.link'].sudo()._refresh_invoices(self)
+        except Exception as e:
+            _logger.error("[COMMISSION] Error indexando facturas %s: %s", self.ids, e, exc_info=True)
+
+
+class AccountMoveLine(models.Model):
+    _inherit = 'account.move.line'
+
+    def _commission_indexed_invoices(self):
+        return self.move_id.filtered(
+            lambda m: m.state == 'posted' and m.move_type in ('out_invoice', 'out_refund')
+        )
+
+    def write(self, vals):
+        if not COMMISSION_LINK_LINE_FIELDS & vals.keys():
+            return super().write(vals)
+        invoices = self._commission_indexed_invoices()
+        res = super().write(vals)
+        (invoices | self._commission_indexed_invoices())._commission_refresh_sale_links()
+        return res
+
+    def unlink(self):
+        invoices = self._commission_indexed_invoices()
+        res = super().unlink()
+        invoices.exists()._commission_refresh_sale_links()
+        return res
+
+
 class AccountPartialReconcile(models.Model):
     _inherit = 'account.partial.reconcile'
 
-    def _create_commission_moves(self):
-        CommissionMove = self.env['commission.move'].sudo()
+    def _commission_partial_data(self):
+        """Primera fase del motor: datos de factura/pago de cada partial.
 
+        Devuelve una lista de dicts (uno por partial aplicable). Todo se lee
+        vía prefetch del ORM sobre el recordset completo, sin búsquedas.
+        """
+        result = []
         for rec in self:
             try:
                 debit_move = rec.debit_move_id
@@ -23,13 +85,14 @@ class AccountPartialReconcile(models.Model):
                     debit_move, credit_move = credit_move, debit_move
 
                 if invoice.move_type not in ('out_invoice', 'out_refund'):
-                    _logger.debug(f"[COMM] partial {rec.id}: no es factura cliente, skip")
+                    _logger.debug("[COMM] partial %s: no es factura cliente, skip", rec.id)
                     continue
 
                 # La línea de la factura en el partial debe ser receivable
                 invoice_line = debit_move if debit_move.move_id == invoice else credit_move
                 if invoice_line.account_id.account_type != 'asset_receivable':
-                    _logger.debug(f"[COMM] partial {rec.id}: cuenta no receivable ({invoice_line.account_id.account_type}), skip")
+                    _logger.debug("[COMM] partial %s: cuenta no receivable (%s), skip",
+                                  rec.id, invoice_line.account_id.account_type)
                     continue
 
                 is_refund = invoice.move_type == 'out_refund'
@@ -66,142 +129,262 @@ class AccountPartialReconcile(models.Model):
                 invoice_untaxed_mxn = abs(invoice_origin.amount_untaxed_signed)
                 paid_base_mxn = invoice_untaxed_mxn * payment_ratio
 
-                _logger.info(f"[COMM] partial {rec.id}: factura={invoice_origin.name}, ratio={round(payment_ratio,4)}, base_mxn={round(paid_base_mxn,2)}")
-
-                # --- Buscar SOs relacionadas ---
-                # Método 1: via líneas de factura -> sale_line_ids
-                sale_orders = self.env['sale.order'].browse()
-                try:
-                    sale_lines = invoice_origin.invoice_line_ids.mapped('sale_line_ids')
-                    if sale_lines:
-                        sale_orders = sale_lines.mapped('order_id').filtered(lambda so: so.commission_rule_ids)
-                except Exception:
-                    pass
-
-                # Método 2: via sale_order.invoice_ids (Many2many en sale.order)
-                if not sale_orders:
-                    sale_orders = self.env['sale.order'].search([
-                        ('invoice_ids', 'in', [invoice_origin.id]),
-                        ('commission_rule_ids', '!=', False),
-                    ])
-                    _logger.info(f"[COMM] partial {rec.id}: fallback SO search result: {sale_orders.mapped('name')}")
-
-                # Método 3: via líneas de la factura -> order_id en sale.order.line
-                if not sale_orders:
-                    inv_line_ids = invoice_origin.invoice_line_ids.ids
-                    if inv_line_ids:
-                        sol_ids = self.env['sale.order.line'].sudo().search([
-                            ('invoice_lines', 'in', inv_line_ids)
-                        ])
-                        if sol_ids:
-                            candidate_sos = sol_ids.mapped('order_id').filtered(lambda so: so.commission_rule_ids)
-                            if candidate_sos:
-                                sale_orders = candidate_sos
-                                _logger.info(f"[COMM] partial {rec.id}: método3 SOs: {sale_orders.mapped('name')}")
-
-                if not sale_orders:
-                    _logger.warning(f"[COMM] partial {rec.id}: sin SOs con reglas de comisión, skip")
+                _logger.debug("[COMM] partial %s: factura=%s, ratio=%.4f, base_mxn=%.2f",
+                              rec.id, invoice_origin.name, payment_ratio, paid_base_mxn)
+
+                result.append({
+                    'partial': rec,
+                    'invoice': invoice,
+                    'invoice_origin': invoice_origin,
+                    'payment': payment,
+                    'is_refund': is_refund,
+                    'company': company,
+                    'company_currency': company_currency,
+                    'payment_ratio': payment_ratio,
+                    'paid_base_mxn': paid_base_mxn,
+                })
+            except Exception as e:
+                if self.env.context.get('commission_raise_errors'):
+                    raise
+                _logger.error("[COMMISSION] Error en partial %s: %s", rec.id, e, exc_info=True)
+        return result
+
+    def _prepare_commission_move_vals(self, profiler=None):
+        """Construye en memoria los valores de commission.move de todo el recordset.
+
+        No consulta las comisiones existentes: el conjunto devuelto es el
+        objetivo completo y la inserción se apoya en la restricción única
+        (ver ``commission.move._create_or_skip``).
+        """
+        profiler = profiler or CommissionProfiler(self.env, 'generation')
+        debug = _logger.isEnabledFor(logging.DEBUG)
+
+        with profiler.phase('partials'):
+            partial_data = self._commission_partial_data()
+        if not partial_data:
+            return []
+
+        with profiler.phase('so_resolution'):
+            invoices = self.env['account.move'].browse(
+                {d['invoice_origin'].id for d in partial_data}
+            )
+            try:
+                with self.env.cr.savepoint():
+                    so_by_invoice = self.env['commission.invoice.sale.link']._get_commission_map(invoices)
+            except Exception as e:
+                if self.env.context.get('commission_raise_errors'):
+                    raise
+                _logger.error("[COMMISSION] Error resolviendo SOs de las facturas %s: %s",
+                              invoices.ids, e, exc_info=True)
+                return []
+
+        with profiler.phase('payments'):
+            payment_moves = self.env['account.move'].browse({d['payment'].id for d in partial_data})
+            payment_by_move = {
+                p.move_id.id: p
+                for p in self.env['account.payment'].search([('move_id', 'in', payment_moves.ids)])
+            }
+
+        seen_keys = set()
+        vals_list = []
+        for data in partial_data:
+            rec = data['partial']
+            try:
+                invoice_origin = data['invoice_origin']
+                if invoice_origin.id not in so_by_invoice:
+                    _logger.debug("[COMM] partial %s: sin SOs con reglas de comisión, skip", rec.id)
                     continue
 
-                _logger.info(f"[COMM] partial {rec.id}: SOs a procesar: {sale_orders.mapped('name')}")
+                sale_orders, so_weights, best_lines = so_by_invoice[invoice_origin.id]
+                if debug:
+                    _logger.debug("[COMM] partial %s: SOs a procesar: %s", rec.id, sale_orders.mapped('name'))
 
-                # --- Peso de cada SO dentro de la factura ---
-                so_weights = {}
-                total_weight = 0.0
-                for so in sale_orders:
-                    so_inv_lines = invoice_origin.invoice_line_ids.filtered(
-                        lambda l, _so=so: l.sale_line_ids & _so.order_line
+                total_weight = sum(so_weights.values())
+                if total_weight == 0:
+                    _logger.warning("[COMM] partial %s: total_weight=0, skip", rec.id)
+                    continue
+
+                with profiler.phase('weighting_conversion'):
+                    vals_list.extend(self._commission_vals_for_partial(
+                        data, sale_orders, so_weights, total_weight, best_lines,
+                        payment_by_move.get(data['payment'].id), seen_keys,
+                    ))
+            except Exception as e:
+                if self.env.context.get('commission_raise_errors'):
+                    raise
+                _logger.error("[COMMISSION] Error en partial %s: %s", rec.id, e, exc_info=True)
+        _logger.debug("[COMM] caché de tasas: %s", CommissionRateCache.get(self.env).stats())
+        return vals_list
+
+    @api.model
+    def _commission_vals_for_partial(self, data, sale_orders, so_weights, total_weight,
+                                     best_lines, payment_rec, seen_keys):
+        rec = data['partial']
+        invoice = data['invoice']
+        invoice_origin = data['invoice_origin']
+        company = data['company']
+        company_currency = data['company_currency']
+        payment_ratio = data['payment_ratio']
+        is_refund = data['is_refund']
+        sign = -1 if is_refund else 1
+        rates = CommissionRateCache.get(self.env)
+        debug = _logger.isEnabledFor(logging.DEBUG)
+
+        vals_list = []
+        for so in sale_orders:
+            so_ratio = so_weights[so.id] / total_weight
+            so_paid_base = data['paid_base_mxn'] * so_ratio
+            best_inv_line = best_lines.get(so.id)
+            date = so.date_order or fields.Date.today()
+
+            so_rate = rates.rate(so.currency_id, company_currency, company, date)
+            so_total_mxn = rates.convert(so.amount_total, so.currency_id, company_currency, company, date)
+            if so_total_mxn == 0:
+                _logger.warning("[COMM] SO %s amount_total=0, skip", so.id)
+                continue
+
+            paid_total_mxn_so = abs(invoice_origin.amount_total_signed) * payment_ratio * so_ratio
+            final_ratio = paid_total_mxn_so / so_total_mxn
+
+            for rule in so.commission_rule_ids:
+                # Un mismo beneficiario con varias reglas en la SO: solo una comisión por clave
+                key = (rec.id, rule.partner_id.id, so.id)
+                if key in seen_keys:
+                    _logger.debug("[COMM] comisión duplicada en el lote partial=%s partner=%s SO=%s, skip",
+                                  rec.id, rule.partner_id.id, so.id)
+                    continue
+
+                if rule.calculation_base == 'manual':
+                    rule_amount = rule.fixed_amount
+                    rule_amount_mxn = rates.convert(
+                        rule.fixed_amount, rule.currency_id, company_currency, company, date
+                    )
+                else:
+                    rule_amount = rule.estimated_amount
+                    rule_amount_mxn = rates.convert(
+                        rule.estimated_amount, so.currency_id, company_currency, company, date
                     )
-                    weight = sum(abs(l.balance) for l in so_inv_lines) if so_inv_lines else 0.0
 
-                    if weight == 0.0:
-                        weight = so.currency_id._convert(
-                            so.amount_total, company_currency, company,
-                            so.date_order or fields.Date.today()
-                        )
+                commission_amount = rule_amount_mxn * final_ratio * sign
 
-                    so_weights[so.id] = weight
-                    total_weight += weight
+                if debug:
+                    _logger.debug("[COMM] SO=%s rule=%s: estimated=%s, rule_mxn=%.2f, final_ratio=%.4f, commission=%.2f",
+                                  so.name, rule.id, rule.estimated_amount, rule_amount_mxn, final_ratio, commission_amount)
 
-                if total_weight == 0:
-                    _logger.warning(f"[COMM] partial {rec.id}: total_weight=0, skip")
+                if abs(commission_amount) < 0.01:
+                    _logger.debug("[COMM] commission_amount=%s < 0.01, skip", commission_amount)
                     continue
 
-                payment_rec = self.env['account.payment'].search(
-                    [('move_id', '=', payment.id)], limit=1
-                )
+                seen_keys.add(key)
+                vals_list.append({
+                    'partner_id': rule.partner_id.id,
+                    'sale_order_id': so.id,
+                    'invoice_line_id': best_inv_line.id if best_inv_line else False,
+                    'payment_id': payment_rec.id if payment_rec else False,
+                    'partial_reconcile_id': rec.id,
+                    'company_id': company.id,
+                    'amount': commission_amount,
+                    'base_amount_paid': so_paid_base * sign,
+                    'currency_id': company_currency.id,
+                    'is_refund': is_refund,
+                    'state': 'draft',
+                    'name': f"Cmsn: {invoice.name} / {so.name} ({round(final_ratio * 100, 1)}%)",
+                    'snapshot': self._commission_snapshot(
+                        data, rule, so_weights[so.id], total_weight, so_rate, so_total_mxn,
+                        paid_total_mxn_so, final_ratio, rule_amount, rule_amount_mxn, sign,
+                    ),
+                })
+        return vals_list
+
+    @api.model
+    def _commission_snapshot(self, data, rule, so_weight, total_weight, so_rate, so_total,
+                             paid_total, final_ratio, rule_amount, rule_amount_company, sign):
+        """Entradas del cálculo de una comisión, en moneda de la compañía.
+
+        Basta para reproducir el monto (``rule_amount_company * final_ratio *
+        sign``) y para saber si un recálculo cambiaría algo sin repetir la
+        cadena de búsquedas.
+        """
+        return {
+            'format': COMMISSION_SNAPSHOT_FORMAT,
+            'rule_id': rule.id,
+            'rule_version': rule.version,
+            'calculation_base': rule.calculation_base,
+            'percent': rule.percent,
+            'payment_ratio': round(data['payment_ratio'], 8),
+            'paid_base': round(data['paid_base_mxn'], 4),
+            'so_weight': round(so_weight, 4),
+            'total_weight': round(total_weight, 4),
+            'so_rate': round(so_rate, 8),
+            'so_total': round(so_total, 4),
+            'paid_total': round(paid_total, 4),
+            'final_ratio': round(final_ratio, 8),
+            'rule_amount': round(rule_amount, 4),
+            'rule_amount_company': round(rule_amount_company, 4),
+            'sign': sign,
+        }
 
-                sign = -1 if is_refund else 1
+    def _create_commission_moves(self):
+        CommissionMove = self.env['commission.move'].sudo()
 
-                for so in sale_orders:
-                    so_ratio = so_weights[so.id] / total_weight
-                    so_paid_base = paid_base_mxn * so_ratio
+        with CommissionProfiler(self.env, 'generation') as profiler:
+            profiler.records = len(self)
+            vals_list = self._prepare_commission_move_vals(profiler)
+            if not vals_list:
+                return CommissionMove
 
-                    so_inv_lines = invoice_origin.invoice_line_ids.filtered(
-                        lambda l, _so=so: l.sale_line_ids & _so.order_line
-                    )
-                    best_inv_line = so_inv_lines[:1] if so_inv_lines else invoice_origin.invoice_line_ids[:1]
-
-                    for rule in so.commission_rule_ids:
-                        already = CommissionMove.search_count([
-                            ('partial_reconcile_id', '=', rec.id),
-                            ('partner_id', '=', rule.partner_id.id),
-                            ('sale_order_id', '=', so.id),
-                        ], limit=1)
-                        if already:
-                            _logger.info(f"[COMM] ya existe comisión partial={rec.id} partner={rule.partner_id.id} SO={so.id}, skip")
-                            continue
-
-                        if rule.calculation_base == 'manual':
-                            rule_amount_mxn = rule.currency_id._convert(
-                                rule.fixed_amount, company_currency, company,
-                                so.date_order or fields.Date.today()
-                            )
-                        else:
-                            rule_amount_mxn = so.currency_id._convert(
-                                rule.estimated_amount, company_currency, company,
-                                so.date_order or fields.Date.today()
-                            )
-
-                        so_total_mxn = so.currency_id._convert(
-                            so.amount_total, company_currency, company,
-                            so.date_order or fields.Date.today()
-                        )
-                        if so_total_mxn == 0:
-                            _logger.warning(f"[COMM] SO {so.id} amount_total=0, skip")
-                            continue
-
-                        paid_total_mxn_so = abs(invoice_origin.amount_total_signed) * payment_ratio * so_ratio
-                        final_ratio = paid_total_mxn_so / so_total_mxn
-                        commission_amount = rule_amount_mxn * final_ratio * sign
-
-                        _logger.info(f"[COMM] SO={so.name} rule={rule.id}: estimated={rule.estimated_amount}, rule_mxn={round(rule_amount_mxn,2)}, final_ratio={round(final_ratio,4)}, commission={round(commission_amount,2)}")
-
-                        if abs(commission_amount) < 0.01:
-                            _logger.warning(f"[COMM] commission_amount={commission_amount} < 0.01, skip")
-                            continue
-
-                        CommissionMove.create({
-                            'partner_id': rule.partner_id.id,
-                            'sale_order_id': so.id,
-                            'invoice_line_id': best_inv_line.id if best_inv_line else False,
-                            'payment_id': payment_rec.id if payment_rec else False,
-                            'partial_reconcile_id': rec.id,
-                            'company_id': company.id,
-                            'amount': commission_amount,
-                            'base_amount_paid': so_paid_base * sign,
-                            'currency_id': company_currency.id,
-                            'is_refund': is_refund,
-                            'state': 'draft',
-                            'name': f"Cmsn: {invoice.name} / {so.name} ({round(final_ratio * 100, 1)}%)",
-                        })
-                        _logger.info(f"[COMM] ✅ Creada comisión {so.name} partner={rule.partner_id.id}: {round(commission_amount,2)}")
+            try:
+                with profiler.phase('insert'):
+                    moves, skipped = CommissionMove._create_or_skip(vals_list)
+            except Exception as e:
+                # En modo inline no hay cola que reintente: nada se descarta sin
+                # intentar cada conciliación por separado (también si los
+                # reintentos por clave repetida se agotaron)
+                if self.env.context.get('commission_raise_errors'):
+                    raise
+                _logger.warning("[COMM] lote de %s comisiones falló (%s), reintentando por conciliación",
+                                len(vals_list), e)
+                with profiler.phase('insert'):
+                    moves, skipped = self._create_commission_moves_per_partial(vals_list)
+            profiler.rows = len(moves)
+        _logger.info("[COMM] ✅ Creadas %s comisiones para %s partials (%s ya existían)",
+                     len(moves), len(self), skipped)
+        return moves
+
+    @api.model
+    def _create_commission_moves_per_partial(self, vals_list):
+        """Inserta las comisiones conciliación por conciliación, cada una en su savepoint.
+
+        Respaldo del insert en bloque: una fila inválida o un error de tasa
+        solo descarta las comisiones de su propia conciliación.
+        Devuelve (movimientos creados, nº de omitidos).
+        """
+        CommissionMove = self.env['commission.move'].sudo()
+        by_partial = {}
+        for vals in vals_list:
+            by_partial.setdefault(vals['partial_reconcile_id'], []).append(vals)
 
+        moves, skipped = CommissionMove, 0
+        for partial_id, partial_vals in by_partial.items():
+            try:
+                with self.env.cr.savepoint():
+                    created, partial_skipped = CommissionMove._create_or_skip(partial_vals)
             except Exception as e:
-                _logger.error(f"[COMMISSION] Error en partial {rec.id}: {e}", exc_info=True)
+                _logger.error("[COMMISSION] Error creando comisiones del partial %s: %s",
+                              partial_id, e, exc_info=True)
+                continue
+            moves |= created
+            skipped += partial_skipped
+        return moves, skipped
 
     @api.model_create_multi
     def create(self, vals_list):
         res = super().create(vals_list)
-        res.sudo()._create_commission_moves()
-        return res
\ No newline at end of file
+        deferred = self.env['ir.config_parameter'].sudo().get_param(
+            'om_advanced_commission.deferred_generation')
+        if deferred:
+            # Modo diferido: solo se encola, el cron genera las comisiones
+            self.env['commission.partial.queue'].sudo()._enqueue(res)
+        else:
+            res.sudo()._create_commission_moves()
+        return res
@@ -47,23 +47,46 @@ class CommissionAuthorization(models.Model):
                 note=f"Solicitud de autorización de comisión extra para {self.sale_order_id.name}: {self.requested_percent}%"
             )
 
-    def action_approve(self):
+    def _check_authorizer(self, message):
         if not self.env.user.has_group('om_advanced_commission.group_commission_authorizer'):
-            raise UserError("No tienes permisos para autorizar comisiones.")
-        self.write({'state': 'approved'})
-        # Notificar al solicitante
-        self.message_post(body=f"✅ Autorización aprobada por {self.env.user.name}")
+            raise UserError(message)
+
+    def _get_pending(self):
+        pending = self.filtered(lambda a: a.state == 'pending')
+        if not pending:
+            raise UserError("No hay solicitudes pendientes entre las seleccionadas.")
+        return pending
+
+    def action_approve(self):
+        self._check_authorizer("No tienes permisos para autorizar comisiones.")
+        pending = self._get_pending()
+        pending.write({'state': 'approved'})
+        # Notas y cierre de actividades en bloque, no una llamada por solicitud
+        body = f"✅ Autorización aprobada por {self.env.user.name}"
+        pending._message_log_batch(bodies={auth.id: body for auth in pending})
+        pending.activity_feedback(['mail.mail_activity_data_todo'], feedback=body)
 
     def action_reject(self):
-        if not self.env.user.has_group('om_advanced_commission.group_commission_authorizer'):
-            raise UserError("No tienes permisos para rechazar autorizaciones.")
+        self._check_authorizer("No tienes permisos para rechazar autorizaciones.")
+        pending = self._get_pending()
         return {
             'type': 'ir.actions.act_window',
             'res_model': 'commission.authorization.reject.wizard',
             'view_mode': 'form',
             'target': 'new',
-            'context': {'default_authorization_id': self.id},
+            'context': {'default_authorization_ids': [(6, 0, pending.ids)]},
         }
 
+    def _reject(self, reason):
+        self._check_authorizer("No tienes permisos para rechazar autorizaciones.")
+        pending = self._get_pending()
+        pending.write({
+            'state': 'rejected',
+            'reject_reason': reason,
+        })
+        body = f"❌ Rechazado por {self.env.user.name}: {reason}"
+        pending._message_log_batch(bodies={auth.id: body for auth in pending})
+        pending.activity_feedback(['mail.mail_activity_data_todo'], feedback=body)
+
     def action_reset_draft(self):
         self.write({'state': 'draft'})
\ No newline at end of file
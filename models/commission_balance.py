@@ -0,0 +1,121 @@
+from odoo import models, fields, api
+
+# Columna del saldo que acumula cada estado de commission.move (cancel no suma)
+BALANCE_STATE_COLUMNS = {
+    'draft': 'amount_accrued',
+    'settled': 'amount_settled',
+    'invoiced': 'amount_invoiced',
+}
+BALANCE_COLUMNS = ('amount_accrued', 'amount_settled', 'amount_invoiced')
+
+
+class CommissionBalance(models.Model):
+    _name = 'commission.balance'
+    _description = 'Saldo de Comisiones por Comisionista'
+    _order = 'period desc, partner_id'
+
+    partner_id = fields.Many2one('res.partner', string='Comisionista', required=True, readonly=True, index=True)
+    company_id = fields.Many2one('res.company', string='Compañía', required=True, readonly=True)
+    currency_id = fields.Many2one('res.currency', string='Moneda', required=True, readonly=True)
+    period = fields.Date(string='Periodo', required=True, readonly=True,
+                         help='Primer día del mes de los movimientos.')
+    amount_accrued = fields.Monetary(string='Pendiente', readonly=True, currency_field='currency_id')
+    amount_settled = fields.Monetary(string='En Liquidación', readonly=True, currency_field='currency_id')
+    amount_invoiced = fields.Monetary(string='Facturado/Pagado', readonly=True, currency_field='currency_id')
+
+    _unique_partner_company_currency_period = models.Constraint(
+        'UNIQUE(partner_id, company_id, currency_id, period)',
+        'Ya existe un saldo para este comisionista, compañía, moneda y periodo.',
+    )
+
+    @api.model
+    def _apply_deltas(self, deltas):
+        """Suma los deltas ``{(partner, compañía, moneda, periodo): {columna: monto}}``.
+
+        Un solo INSERT ... ON CONFLICT DO UPDATE con incrementos: dos
+        transacciones que tocan el mismo saldo se serializan en la fila sin
+        perder ninguna suma. Las claves se ordenan para bloquear siempre en el
+        mismo orden y evitar interbloqueos.
+        """
+        rows = [(key, values) for key, values in sorted(deltas.items()) if any(values.values())]
+        if not rows:
+            return
+        columns = {name: [values.get(name, 0.0) for _key, values in rows] for name in BALANCE_COLUMNS}
+        self.env.cr.execute("""
+            INSERT INTO commission_balance
+                   (partner_id, company_id, currency_id, period,
+                    amount_accrued, amount_settled, amount_invoiced,
+                    create_uid, create_date, write_uid, write_date)
+            SELECT v.partner_id, v.company_id, v.currency_id, v.period,
+                   v.accrued, v.settled, v.invoiced,
+                   %(uid)s, now() at time zone 'UTC', %(uid)s, now() at time zone 'UTC'
+              FROM unnest(%(partners)s::int[], %(companies)s::int[], %(currencies)s::int[], %(periods)s::date[],
+                          %(accrued)s::numeric[], %(settled)s::numeric[], %(invoiced)s::numeric[])
+                   AS v(partner_id, company_id, currency_id, period, accrued, settled, invoiced)
+            ON CONFLICT (partner_id, company_id, currency_id, period) DO UPDATE
+               SET amount_accrued = commission_balance.amount_accrued + EXCLUDED.amount_accrued,
+                   amount_settled = commission_balance.amount_settled + EXCLUDED.amount_settled,
+                   amount_invoiced = commission_balance.amount_invoiced + EXCLUDED.amount_invoiced,
+                   write_uid = EXCLUDED.write_uid,
+                   write_date = EXCLUDED.write_date
+        """, {
+            'uid': self.env.uid,
+            'partners': [key[0] for key, _values in rows],
+            'companies': [key[1] for key, _values in rows],
+            'currencies': [key[2] for key, _values in rows],
+            'periods': [key[3] for key, _values in rows],
+            'accrued': columns['amount_accrued'],
+            'settled': columns['amount_settled'],
+            'invoiced': columns['amount_invoiced'],
+        })
+        self.invalidate_model(list(BALANCE_COLUMNS))
+        self.env['commission.dashboard']._invalidate_partners({key[0] for key, _values in rows})
+
+    @api.model
+    def _rebuild(self):
+        """Recalcula todos los saldos desde commission.move (y su archivo) en un solo INSERT ... SELECT."""
+        self.env['commission.move'].flush_model()
+        self.env.cr.execute("DELETE FROM commission_balance")
+        self.env.cr.execute("""
+            INSERT INTO commission_balance
+                   (partner_id, company_id, currency_id, period,
+                    amount_accrued, amount_settled, amount_invoiced,
+                    create_uid, create_date, write_uid, write_date)
+            SELECT partner_id, company_id, currency_id,
+                   date_trunc('month', COALESCE(date, create_date::date))::date,
+                   COALESCE(SUM(amount) FILTER (WHERE state = 'draft'), 0),
+                   COALESCE(SUM(amount) FILTER (WHERE state = 'settled'), 0),
+                   COALESCE(SUM(amount) FILTER (WHERE state = 'invoiced'), 0),
+                   %(uid)s, now() at time zone 'UTC', %(uid)s, now() at time zone 'UTC'
+              FROM (SELECT partner_id, company_id, currency_id, date, create_date, amount, state
+                      FROM commission_move
+                    UNION ALL
+                    SELECT partner_id, company_id, currency_id, date, create_date, amount, state
+                      FROM commission_move_archive) AS moves
+             WHERE state != 'cancel'
+             GROUP BY 1, 2, 3, 4
+        """, {'uid': self.env.uid})
+        self.invalidate_model()
+        self.env['commission.dashboard']._invalidate_partners()
+
+    def action_rebuild(self):
+        self._rebuild()
+        return {'type': 'ir.actions.client', 'tag': 'reload'}
+
+    @api.model
+    def _get_partner_balances(self, partner_ids=None, company_id=None):
+        """Saldos vigentes por (comisionista, moneda), sumando todos los periodos.
+
+        Devuelve ``{(partner_id, currency_id): {'accrued', 'settled', 'invoiced'}}``
+        leyendo la tabla de saldos, nunca los movimientos.
+        """
+        domain = [('company_id', '=', company_id or self.env.company.id)]
+        if partner_ids:
+            domain.append(('partner_id', 'in', partner_ids))
+        return {
+            (partner.id, currency.id): {'accrued': accrued, 'settled': settled, 'invoiced': invoiced}
+            for partner, currency, accrued, settled, invoiced in self._read_group(
+                domain, ['partner_id', 'currency_id'],
+                ['amount_accrued:sum', 'amount_settled:sum', 'amount_invoiced:sum'],
+            )
+        }
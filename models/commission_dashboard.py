@@ -0,0 +1,103 @@
+from odoo import models, fields, api
+from functools import partial
+import time
+
+# Segundos que un tablero calculado se sirve desde memoria
+DASHBOARD_TTL = 60
+DASHBOARD_TOP_ORDERS = 5
+DASHBOARD_CACHE_MAX = 2000
+
+# (bd, comisionista, compañías) -> (expira, datos). Vive en cada worker; los
+# cambios de saldo invalidan al confirmar la transacción y el TTL acota lo que
+# otro worker pueda servir desactualizado.
+_dashboard_cache = {}
+
+
+def invalidate_dashboard_cache(dbname, partner_ids=None):
+    """Descarta los tableros de esos comisionistas (todos si ``partner_ids`` es None)."""
+    for key in list(_dashboard_cache):
+        if key[0] == dbname and (partner_ids is None or key[1] in partner_ids):
+            _dashboard_cache.pop(key, None)
+
+
+class CommissionDashboard(models.AbstractModel):
+    _name = 'commission.dashboard'
+    _description = 'Tablero de Comisiones por Comisionista'
+
+    @api.model
+    def _invalidate_partners(self, partner_ids=None):
+        self.env.cr.postcommit.add(partial(
+            invalidate_dashboard_cache, self.env.cr.dbname,
+            None if partner_ids is None else frozenset(partner_ids),
+        ))
+
+    @api.model
+    def _get_dashboard_partner(self, partner_id=None):
+        # Solo el administrador puede consultar el tablero de otro comisionista
+        if partner_id and self.env.user.has_group('om_advanced_commission.group_commission_manager'):
+            return self.env['res.partner'].browse(partner_id).exists()
+        return self.env.user.partner_id
+
+    @api.model
+    def get_dashboard_data(self, partner_id=None):
+        partner = self._get_dashboard_partner(partner_id)
+        if not partner:
+            return {}
+        key = (self.env.cr.dbname, partner.id, tuple(sorted(self.env.companies.ids)))
+        now = time.monotonic()
+        cached = _dashboard_cache.get(key)
+        if cached and cached[0] > now:
+            return cached[1]
+
+        data = self._compute_dashboard_data(partner)
+        if len(_dashboard_cache) >= DASHBOARD_CACHE_MAX:
+            for stale in [k for k, (expiry, _data) in list(_dashboard_cache.items()) if expiry <= now]:
+                _dashboard_cache.pop(stale, None)
+        _dashboard_cache[key] = (now + DASHBOARD_TTL, data)
+        return data
+
+    @api.model
+    def _compute_dashboard_data(self, partner):
+        """KPIs del comisionista con dos consultas agrupadas.
+
+        Los totales salen de commission.balance (una fila por mes) y el top de
+        órdenes de un _read_group sobre commission.move. El acceso ya se validó
+        en _get_dashboard_partner, así que se consulta en sudo con el filtro
+        explícito y sin el join de la regla de registro.
+        """
+        today = fields.Date.context_today(self)
+        month_start = today.replace(day=1)
+        year_start = today.replace(month=1, day=1)
+        company_ids = self.env.companies.ids
+
+        kpis = {'accrued_month': 0.0, 'pending_settlement': 0.0, 'in_settlement': 0.0, 'paid_ytd': 0.0}
+        for period, accrued, settled, invoiced in self.env['commission.balance'].sudo()._read_group(
+            [('partner_id', '=', partner.id), ('company_id', 'in', company_ids)],
+            ['period:month'],
+            ['amount_accrued:sum', 'amount_settled:sum', 'amount_invoiced:sum'],
+        ):
+            kpis['pending_settlement'] += accrued
+            kpis['in_settlement'] += settled
+            if period >= year_start:
+                kpis['paid_ytd'] += invoiced
+            if period == month_start:
+                kpis['accrued_month'] += accrued + settled + invoiced
+
+        top_orders = [
+            {'id': order.id, 'name': order.name, 'amount': amount}
+            for order, amount in self.env['commission.move'].sudo()._read_group(
+                [('partner_id', '=', partner.id), ('company_id', 'in', company_ids),
+                 ('state', '!=', 'cancel'), ('date', '>=', year_start), ('sale_order_id', '!=', False)],
+                ['sale_order_id'], ['amount:sum'],
+                order='amount:sum desc', limit=DASHBOARD_TOP_ORDERS,
+            )
+        ]
+
+        currency = self.env.company.currency_id
+        return dict(
+            kpis,
+            partner={'id': partner.id, 'name': partner.name},
+            currency={'name': currency.name, 'symbol': currency.symbol, 'position': currency.position},
+            top_orders=top_orders,
+            computed_at=fields.Datetime.to_string(fields.Datetime.now()),
+        )
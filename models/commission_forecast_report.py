@@ -0,0 +1,56 @@
+from odoo import models, fields, tools
+
+
+class CommissionForecastReport(models.Model):
+    _name = 'commission.forecast.report'
+    _description = 'Pronóstico de Comisiones del Pipeline'
+    _auto = False
+    _order = 'month desc, partner_id'
+
+    rule_id = fields.Many2one('sale.commission.rule', string='Regla', readonly=True)
+    sale_order_id = fields.Many2one('sale.order', string='Orden de Venta', readonly=True)
+    partner_id = fields.Many2one('res.partner', string='Beneficiario', readonly=True)
+    role_type = fields.Selection([
+        ('internal', 'Vendedor'),
+        ('architect', 'Arquitecto'),
+        ('construction', 'Constructora'),
+        ('referrer', 'Referidor')
+    ], string='Rol', readonly=True)
+    order_state = fields.Selection([
+        ('draft', 'Cotización'),
+        ('sent', 'Cotización Enviada'),
+        ('sale', 'Orden de Venta'),
+        ('cancel', 'Cancelada'),
+    ], string='Estado Orden', readonly=True)
+    month = fields.Date(string='Mes', readonly=True)
+    company_id = fields.Many2one('res.company', string='Compañía', readonly=True)
+    currency_id = fields.Many2one('res.currency', string='Moneda', readonly=True)
+    estimated_amount = fields.Monetary(string='Comisión Estimada (Moneda Orden)', readonly=True)
+    company_currency_id = fields.Many2one('res.currency', string='Moneda Compañía', readonly=True)
+    estimated_amount_company = fields.Monetary(string='Comisión Estimada', readonly=True,
+                                               currency_field='company_currency_id',
+                                               help='Estimado convertido con la tasa de la orden; es el que se suma.')
+
+    def init(self):
+        tools.drop_view_if_exists(self.env.cr, self._table)
+        self.env.cr.execute(f"""
+            CREATE OR REPLACE VIEW {self._table} AS (
+                SELECT r.id AS id,
+                       r.id AS rule_id,
+                       r.sale_order_id,
+                       r.partner_id,
+                       r.role_type,
+                       so.state AS order_state,
+                       date_trunc('month', so.date_order)::date AS month,
+                       so.company_id,
+                       so.currency_id,
+                       r.estimated_amount,
+                       c.currency_id AS company_currency_id,
+                       r.estimated_amount / CASE COALESCE(so.currency_rate, 0)
+                                                WHEN 0 THEN 1.0 ELSE so.currency_rate END
+                           AS estimated_amount_company
+                  FROM sale_commission_rule r
+                  JOIN sale_order so ON so.id = r.sale_order_id
+                  JOIN res_company c ON c.id = so.company_id
+            )
+        """)
@@ -0,0 +1,192 @@
+from odoo import models, fields, api
+
+from .commission_rate_cache import CommissionRateCache
+
+# Orden de preferencia de los métodos de resolución factura -> SO
+LINK_METHODS = [
+    ('line', 'Líneas de Factura'),
+    ('invoice', 'Facturas de la SO'),
+    ('order_line', 'Líneas de la SO'),
+]
+
+
+class CommissionInvoiceSaleLink(models.Model):
+    _name = 'commission.invoice.sale.link'
+    _description = 'Índice Factura - Orden de Venta para Comisiones'
+    _order = 'invoice_id, id'
+
+    invoice_id = fields.Many2one('account.move', string='Factura', required=True,
+                                 ondelete='cascade', index=True)
+    sale_order_id = fields.Many2one('sale.order', string='Orden de Venta', required=True,
+                                    ondelete='cascade', index=True)
+    method = fields.Selection(LINK_METHODS, string='Resolución', required=True, default='line')
+    weight = fields.Float(string='Peso (Moneda Compañía)',
+                          help='Importe de la factura atribuible a la SO, usado para repartir pagos. '
+                               'En 0 (SO sin líneas en la factura) se usa el total vigente de la SO.')
+    best_line_id = fields.Many2one('account.move.line', string='Línea de Factura Principal',
+                                   ondelete='set null')
+
+    _unique_invoice_sale_order = models.Constraint(
+        'UNIQUE(invoice_id, sale_order_id)',
+        'La orden de venta ya está indexada para esta factura.',
+    )
+
+    @api.model
+    def _resolve(self, invoices):
+        """Aplica los tres métodos de búsqueda a todas las facturas a la vez.
+
+        Devuelve {invoice_id: {so_id: método}} sin filtrar por reglas de
+        comisión, de modo que el índice siga siendo válido si las reglas cambian.
+        """
+        SaleOrder = self.env['sale.order'].sudo()
+        found = {inv.id: {} for inv in invoices}
+
+        # Método 1: via líneas de factura -> sale_line_ids
+        for inv in invoices:
+            for so in inv.invoice_line_ids.sale_line_ids.order_id:
+                found[inv.id].setdefault(so.id, 'line')
+
+        # Método 2: via sale_order.invoice_ids (Many2many en sale.order)
+        for so in SaleOrder.search([('invoice_ids', 'in', invoices.ids)]):
+            for inv in so.invoice_ids & invoices:
+                found[inv.id].setdefault(so.id, 'invoice')
+
+        # Método 3: via líneas de la factura -> order_id en sale.order.line
+        if invoices.invoice_line_ids:
+            sols = self.env['sale.order.line'].sudo().search([
+                ('invoice_lines', 'in', invoices.invoice_line_ids.ids)
+            ])
+            for sol in sols:
+                for inv in sol.invoice_lines.move_id & invoices:
+                    found[inv.id].setdefault(sol.order_id.id, 'order_line')
+        return found
+
+    @api.model
+    def _compute_weights(self, invoice, sale_orders):
+        """Peso de cada SO dentro de la factura y su mejor línea de factura.
+
+        Solo se guarda lo que aportan las líneas de la factura; las SOs sin
+        líneas quedan en 0 y su peso se calcula al leer (``_fallback_weight``),
+        para que siga al total de la SO si este cambia tras indexar.
+        Devuelve ({so_id: peso}, {so_id: account.move.line}).
+        """
+        inv_lines = invoice.invoice_line_ids
+
+        so_weights = {so.id: 0.0 for so in sale_orders}
+        best_lines = {}
+        for line in inv_lines:
+            for so in line.sale_line_ids.order_id & sale_orders:
+                so_weights[so.id] += abs(line.balance)
+                best_lines.setdefault(so.id, line)
+
+        for so in sale_orders:
+            best_lines.setdefault(so.id, inv_lines[:1])
+        return so_weights, best_lines
+
+    @api.model
+    def _fallback_weight(self, sale_order, company):
+        """Peso de una SO sin líneas en la factura: su total en moneda de la compañía."""
+        return CommissionRateCache.get(self.env).convert(
+            sale_order.amount_total, sale_order.currency_id, company.currency_id, company,
+            sale_order.date_order or fields.Date.today()
+        )
+
+    @api.model
+    def _refresh_invoices(self, invoices):
+        """Reconstruye el índice de las facturas dadas (borrado + alta en bloque).
+
+        El alta es un INSERT ... ON CONFLICT DO NOTHING: dos conciliaciones
+        concurrentes que indexan la misma factura producen el mismo índice, y
+        la segunda simplemente no inserta nada en lugar de fallar.
+        """
+        invoices = invoices.filtered(lambda m: m.move_type in ('out_invoice', 'out_refund'))
+        if not invoices:
+            return self.browse()
+
+        self.env.cr.execute(
+            "DELETE FROM commission_invoice_sale_link WHERE invoice_id = ANY(%s)", [invoices.ids]
+        )
+        self.invalidate_model()
+
+        found = self._resolve(invoices)
+        vals_list = []
+        for inv in invoices:
+            if not found[inv.id]:
+                continue
+            sale_orders = self.env['sale.order'].sudo().browse(list(found[inv.id]))
+            weights, best_lines = self._compute_weights(inv, sale_orders)
+            for so_id, method in found[inv.id].items():
+                vals_list.append({
+                    'invoice_id': inv.id,
+                    'sale_order_id': so_id,
+                    'method': method,
+                    'weight': weights[so_id],
+                    'best_line_id': best_lines[so_id].id or False,
+                })
+
+        self.env.cr.execute(
+            "UPDATE account_move SET commission_link_indexed = TRUE WHERE id = ANY(%s)", [invoices.ids]
+        )
+        invoices.invalidate_recordset(['commission_link_indexed'])
+        if not vals_list:
+            return self.browse()
+
+        self.env.cr.execute("""
+            INSERT INTO commission_invoice_sale_link
+                   (invoice_id, sale_order_id, method, weight, best_line_id,
+                    create_uid, create_date, write_uid, write_date)
+            SELECT v.invoice_id, v.sale_order_id, v.method, v.weight, NULLIF(v.best_line_id, 0),
+                   %(uid)s, now() at time zone 'UTC', %(uid)s, now() at time zone 'UTC'
+              FROM unnest(%(invoices)s::int[], %(orders)s::int[], %(methods)s::varchar[],
+                          %(weights)s::float8[], %(lines)s::int[])
+                   AS v(invoice_id, sale_order_id, method, weight, best_line_id)
+            ON CONFLICT (invoice_id, sale_order_id) DO NOTHING
+         RETURNING id
+        """, {
+            'uid': self.env.uid,
+            'invoices': [v['invoice_id'] for v in vals_list],
+            'orders': [v['sale_order_id'] for v in vals_list],
+            'methods': [v['method'] for v in vals_list],
+            'weights': [v['weight'] for v in vals_list],
+            'lines': [v['best_line_id'] or 0 for v in vals_list],
+        })
+        return self.browse([row[0] for row in self.env.cr.fetchall()])
+
+    @api.model
+    def _get_commission_map(self, invoices):
+        """SOs con reglas de comisión, pesos y mejor línea por factura, en una lectura.
+
+        Las facturas aún no indexadas (anteriores al índice) se indexan aquí.
+        Devuelve {invoice_id: (sale.order, {so_id: peso}, {so_id: línea})}.
+        """
+        missing = invoices.filtered(lambda m: not m.commission_link_indexed)
+        if missing:
+            self.sudo()._refresh_invoices(missing)
+
+        links = self.sudo().search([('invoice_id', 'in', invoices.ids)])
+        by_invoice = {}
+        for link in links:
+            by_invoice.setdefault(link.invoice_id.id, self.browse())
+            by_invoice[link.invoice_id.id] |= link
+
+        method_order = [m for m, _label in LINK_METHODS]
+        result = {}
+        for inv_id, inv_links in by_invoice.items():
+            # Se usa el primer método que aporte SOs con reglas, igual que la búsqueda en cascada
+            for method in method_order:
+                selected = inv_links.filtered(
+                    lambda l, _m=method: l.method == _m and l.sale_order_id.commission_rule_ids
+                )
+                if selected:
+                    break
+            if not selected:
+                continue
+            result[inv_id] = (
+                selected.sale_order_id,
+                {
+                    l.sale_order_id.id: l.weight or self._fallback_weight(l.sale_order_id, l.invoice_id.company_id)
+                    for l in selected
+                },
+                {l.sale_order_id.id: l.best_line_id for l in selected},
+            )
+        return result
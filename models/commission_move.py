@@ -1,4 +1,22 @@
+import json
+
 from odoo import models, fields, api
+from odoo.tools.sql import create_index
+
+from .commission_balance import BALANCE_STATE_COLUMNS, BALANCE_COLUMNS
+
+# Columnas (y tipo SQL) que escribe la inserción en bloque de _create_or_skip
+INSERT_COLUMNS = [
+    ('name', 'varchar'), ('partner_id', 'int'), ('sale_order_id', 'int'),
+    ('invoice_line_id', 'int'), ('payment_id', 'int'), ('partial_reconcile_id', 'int'),
+    ('company_id', 'int'), ('amount', 'numeric'), ('base_amount_paid', 'numeric'),
+    ('currency_id', 'int'), ('date', 'date'), ('is_refund', 'bool'), ('state', 'varchar'),
+    ('snapshot', 'jsonb'),
+]
+# Campos que alteran el saldo de commission.balance
+BALANCE_FIELDS = {'partner_id', 'company_id', 'currency_id', 'date', 'amount', 'state'}
+# Campos derivados por completo de las entradas guardadas en el snapshot
+SNAPSHOT_FIELDS = {'snapshot', 'amount', 'base_amount_paid'}
 
 
 class CommissionMove(models.Model):
@@ -26,6 +44,9 @@ class CommissionMove(models.Model):
     date = fields.Date(default=fields.Date.context_today)
 
     is_refund = fields.Boolean(string='Es Devolución', default=False)
+    snapshot = fields.Json(string='Datos de Cálculo', readonly=True, copy=False,
+                           help='Entradas usadas por el motor: proporciones, pesos, tasas y versión de la regla.')
+    snapshot_display = fields.Text(string='Detalle del Cálculo', compute='_compute_snapshot_display')
     state = fields.Selection([
         ('draft', 'Pendiente'),
         ('settled', 'En Liquidación'),
@@ -33,15 +54,208 @@ class CommissionMove(models.Model):
         ('cancel', 'Cancelado')
     ], default='draft', string='Estado', index=True)
 
-    _sql_constraints = [
-        ('unique_commission_per_reconcile_partner_rule',
-         'UNIQUE(partial_reconcile_id, partner_id, sale_order_id)',
-         'Ya existe una comisión para esta conciliación, comisionista y orden de venta.'),
-    ]
+    _unique_commission_per_reconcile_partner_rule = models.Constraint(
+        'UNIQUE(partial_reconcile_id, partner_id, sale_order_id)',
+        'Ya existe una comisión para esta conciliación, comisionista y orden de venta.',
+    )
+
+    @api.depends('snapshot')
+    def _compute_snapshot_display(self):
+        for move in self:
+            move.snapshot_display = '\n'.join(
+                f"{name}: {value}" for name, value in (move.snapshot or {}).items()
+            )
+
+    def _replay_amount(self):
+        """Monto reproducido desde el snapshot, sin recalcular la cadena (None si no hay)."""
+        self.ensure_one()
+        snap = self.snapshot
+        if not snap:
+            return None
+        return self.currency_id.round(snap['rule_amount_company'] * snap['final_ratio'] * snap['sign'])
+
+    def action_verify_snapshot(self):
+        """Audita que el monto de cada movimiento coincida con el reproducido desde su snapshot."""
+        mismatched = self.browse()
+        without_snapshot = 0
+        for move in self:
+            replayed = move._replay_amount()
+            if replayed is None:
+                without_snapshot += 1
+            elif move.currency_id.compare_amounts(move.amount, replayed):
+                mismatched |= move
+        if mismatched:
+            message = (f"{len(mismatched)} movimientos no coinciden con su cálculo: "
+                       f"{', '.join(mismatched.mapped('name'))}.")
+            notification_type = 'danger'
+        else:
+            message = f"{len(self) - without_snapshot} movimientos coinciden con su cálculo."
+            notification_type = 'success'
+        if without_snapshot:
+            message += f" {without_snapshot} sin datos de cálculo."
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {'title': 'Verificación de Comisiones', 'message': message,
+                       'type': notification_type, 'sticky': bool(mismatched)},
+        }
+
+    def init(self):
+        # Índices compuestos según los accesos reales:
+        # liquidación (draft por fecha y comisionista), reporte (compañía, fecha,
+        # comisionista sin cancelados) y recálculo (SO y estado)
+        create_index(self.env.cr, 'commission_move_draft_date_partner_idx', self._table,
+                     ['date', 'partner_id'], where="state = 'draft'")
+        create_index(self.env.cr, 'commission_move_company_date_partner_idx', self._table,
+                     ['company_id', 'date', 'partner_id'], where="state != 'cancel'")
+        create_index(self.env.cr, 'commission_move_sale_order_state_idx', self._table,
+                     ['sale_order_id', 'state'])
 
     @api.model_create_multi
     def create(self, vals_list):
-        for vals in vals_list:
-            if vals.get('name', '/') == '/':
-                vals['name'] = self.env['ir.sequence'].next_by_code('commission.move') or 'COMM'
-        return super().create(vals_list)
\ No newline at end of file
+        to_name = [vals for vals in vals_list if vals.get('name', '/') == '/']
+        if to_name:
+            for vals, name in zip(to_name, self._reserve_names(len(to_name))):
+                vals['name'] = name
+        moves = super().create(vals_list)
+        self.env['commission.balance']._apply_deltas(moves._balance_deltas())
+        return moves
+
+    def write(self, vals):
+        if not BALANCE_FIELDS.intersection(vals):
+            return super().write(vals)
+        deltas = self._balance_deltas(-1)
+        res = super().write(vals)
+        self._balance_deltas(1, deltas)
+        self.env['commission.balance']._apply_deltas(deltas)
+        return res
+
+    def unlink(self):
+        deltas = self._balance_deltas(-1)
+        res = super().unlink()
+        self.env['commission.balance']._apply_deltas(deltas)
+        return res
+
+    def _balance_deltas(self, sign=1, deltas=None):
+        """Aporte de los movimientos a commission.balance, multiplicado por ``sign``."""
+        deltas = {} if deltas is None else deltas
+        for move in self:
+            column = BALANCE_STATE_COLUMNS.get(move.state)
+            if not column or not move.amount:
+                continue
+            period = fields.Date.start_of(move.date or move.create_date.date(), 'month')
+            key = (move.partner_id.id, move.company_id.id, move.currency_id.id, period)
+            values = deltas.setdefault(key, dict.fromkeys(BALANCE_COLUMNS, 0.0))
+            values[column] += sign * move.amount
+        return deltas
+
+    @api.model
+    def _reserve_names(self, count):
+        """Reserva ``count`` folios de la secuencia COMM/ en un solo paso.
+
+        Secuencia estándar: un único ``nextval`` sobre generate_series, sin
+        bloqueos. Secuencia sin huecos: un solo UPDATE que avanza el contador
+        ``count`` posiciones (un bloqueo por lote, no por movimiento).
+        """
+        Sequence = self.env['ir.sequence'].sudo()
+        seq = Sequence.search([
+            ('code', '=', 'commission.move'),
+            ('company_id', 'in', [self.env.company.id, False]),
+        ], order='company_id', limit=1)
+        if not seq:
+            return ['COMM'] * count
+        if seq.use_date_range:
+            # Los rangos por fecha tienen su propio contador: se respeta el camino estándar
+            return [Sequence.next_by_code('commission.move') for _i in range(count)]
+
+        if seq.implementation == 'standard':
+            self.env.cr.execute(
+                "SELECT nextval(%s) FROM generate_series(1, %s)",
+                [f"ir_sequence_{seq.id:03d}", count],
+            )
+            numbers = [row[0] for row in self.env.cr.fetchall()]
+        else:
+            self.env.cr.execute("""
+                UPDATE ir_sequence
+                   SET number_next = number_next + %s * number_increment
+                 WHERE id = %s
+             RETURNING number_next - %s * number_increment, number_increment
+            """, [count, seq.id, count])
+            start, increment = self.env.cr.fetchone()
+            seq.invalidate_recordset(['number_next'])
+            numbers = [start + i * increment for i in range(count)]
+        return [seq.get_next_char(number) for number in numbers]
+
+    @api.model
+    def _commission_key(self, vals):
+        return (vals.get('partial_reconcile_id'), vals.get('partner_id'), vals.get('sale_order_id'))
+
+    @api.model
+    def _create_or_skip(self, vals_list):
+        """Inserta en bloque omitiendo las claves que ya existen.
+
+        Un solo INSERT ... ON CONFLICT DO NOTHING sobre la restricción única
+        (conciliación, comisionista, SO): las claves ya existentes o insertadas
+        en paralelo por otra conciliación se descartan en la propia base, sin
+        releerlas (bajo REPEATABLE READ no serían visibles). Si la fila en
+        conflicto se confirmó después de nuestro snapshot, PostgreSQL lanza un
+        error de serialización y Odoo reintenta la transacción completa.
+        Devuelve (movimientos creados, nº de omitidos).
+        """
+        # Las claves archivadas ya no están protegidas por la restricción única
+        archived = self.env['commission.move.archive']._archived_keys(
+            partial_ids={v.get('partial_reconcile_id') for v in vals_list if v.get('partial_reconcile_id')})
+        remaining = [
+            self._add_missing_default_values(dict(v))
+            for v in vals_list if self._commission_key(v) not in archived
+        ]
+        if not remaining:
+            return self.browse(), len(vals_list)
+        to_name = [vals for vals in remaining if vals.get('name', '/') == '/']
+        for vals, name in zip(to_name, self._reserve_names(len(to_name))):
+            vals['name'] = name
+
+        self.flush_model()
+        columns = [column for column, _type in INSERT_COLUMNS]
+        arrays = []
+        for column, sql_type in INSERT_COLUMNS:
+            if column == 'snapshot':
+                arrays.append([json.dumps(v['snapshot']) if v.get('snapshot') else None for v in remaining])
+            elif sql_type in ('bool', 'numeric'):
+                arrays.append([v.get(column) or (False if sql_type == 'bool' else 0.0) for v in remaining])
+            else:
+                arrays.append([v.get(column) or None for v in remaining])
+        self.env.cr.execute(f"""
+            INSERT INTO commission_move ({', '.join(columns)},
+                                         create_uid, create_date, write_uid, write_date)
+            SELECT {', '.join(f'u.{column}' for column in columns)},
+                   %s, now() at time zone 'UTC', %s, now() at time zone 'UTC'
+              FROM unnest({', '.join(f'%s::{sql_type}[]' for _column, sql_type in INSERT_COLUMNS)})
+                AS u({', '.join(columns)})
+            ON CONFLICT (partial_reconcile_id, partner_id, sale_order_id) DO NOTHING
+            RETURNING id
+        """, [self.env.uid, self.env.uid, *arrays])
+        moves = self.browse(row[0] for row in self.env.cr.fetchall())
+        self.env['commission.balance']._apply_deltas(moves._balance_deltas())
+        return moves, len(vals_list) - len(moves)
+
+    def _commission_vals_differ(self, vals):
+        """Indica si los valores calculados por el motor difieren del movimiento."""
+        self.ensure_one()
+        # Mismas entradas, mismo resultado: los montos no se comparan, pero sí
+        # los campos que el snapshot no captura (folio, pago, línea, devolución)
+        same_snapshot = bool(vals.get('snapshot')) and vals['snapshot'] == self.snapshot
+        for fname, value in vals.items():
+            if same_snapshot and fname in SNAPSHOT_FIELDS:
+                continue
+            field = self._fields[fname]
+            current = self[fname]
+            if field.type == 'many2one':
+                if current.id != (value or False):
+                    return True
+            elif field.type == 'monetary':
+                if self.currency_id.compare_amounts(current, value):
+                    return True
+            elif current != value:
+                return True
+        return False
@@ -0,0 +1,111 @@
+from odoo import models, fields, api
+import logging
+
+_logger = logging.getLogger(__name__)
+
+ARCHIVE_YEARS_PARAM = 'om_advanced_commission.archive_years'
+ARCHIVE_CHUNK = 10000
+# Columnas copiadas tal cual de commission_move a commission_move_archive
+ARCHIVE_COLUMNS = [
+    'name', 'partner_id', 'sale_order_id', 'invoice_line_id', 'payment_id', 'partial_reconcile_id',
+    'settlement_id', 'company_id', 'amount', 'base_amount_paid', 'currency_id', 'date', 'is_refund',
+    'state', 'snapshot', 'create_uid', 'create_date', 'write_uid', 'write_date',
+]
+
+
+class CommissionMoveArchive(models.Model):
+    _name = 'commission.move.archive'
+    _description = 'Movimiento de Comisión Archivado'
+    _order = 'date desc, id desc'
+
+    move_id = fields.Integer(string='ID Original', readonly=True, index=True)
+    name = fields.Char(string='Referencia', readonly=True)
+    partner_id = fields.Many2one('res.partner', string='Comisionista', readonly=True, index=True)
+    sale_order_id = fields.Many2one('sale.order', string='Origen Venta', readonly=True, index=True,
+                                    ondelete='set null')
+    invoice_line_id = fields.Many2one('account.move.line', string='Línea de Factura Origen', readonly=True,
+                                      ondelete='set null')
+    payment_id = fields.Many2one('account.payment', string='Pago Cliente', readonly=True, ondelete='set null')
+    partial_reconcile_id = fields.Many2one('account.partial.reconcile', string='Conciliación Origen',
+                                           readonly=True, index=True, ondelete='set null')
+    settlement_id = fields.Many2one('commission.settlement', string='Liquidación', readonly=True,
+                                    ondelete='set null')
+    company_id = fields.Many2one('res.company', string='Compañía', readonly=True)
+    amount = fields.Monetary(string='Monto Comisión', currency_field='currency_id', readonly=True)
+    base_amount_paid = fields.Monetary(string='Base Cobrada', currency_field='currency_id', readonly=True)
+    currency_id = fields.Many2one('res.currency', readonly=True)
+    date = fields.Date(readonly=True)
+    is_refund = fields.Boolean(string='Es Devolución', readonly=True)
+    snapshot = fields.Json(string='Datos de Cálculo', readonly=True)
+    state = fields.Selection([
+        ('invoiced', 'Facturado/Pagado'),
+        ('cancel', 'Cancelado'),
+    ], string='Estado', readonly=True)
+    archive_date = fields.Datetime(string='Archivado el', readonly=True)
+
+    @api.model
+    def _archived_keys(self, sale_order_id=None, partial_ids=None):
+        """Claves (conciliación, comisionista, SO) ya archivadas.
+
+        El motor las trata como existentes: la restricción única de
+        commission.move ya no las cubre una vez fuera de la tabla caliente.
+        """
+        if sale_order_id:
+            where, params = "sale_order_id = %s", [sale_order_id]
+        elif partial_ids:
+            where, params = "partial_reconcile_id = ANY(%s)", [list(partial_ids)]
+        else:
+            return set()
+        self.env.cr.execute(f"""
+            SELECT partial_reconcile_id, partner_id, sale_order_id
+              FROM commission_move_archive
+             WHERE {where}
+        """, params)
+        return {tuple(value or False for value in row) for row in self.env.cr.fetchall()}
+
+    @api.model
+    def _archive_moves(self, before_date, limit=ARCHIVE_CHUNK):
+        """Mueve a la tabla de archivo un bloque de movimientos cerrados.
+
+        Un solo DELETE ... RETURNING alimenta el INSERT, así un movimiento
+        nunca queda en las dos tablas ni en ninguna. Los saldos de
+        commission.balance no cambian: el archivo conserva el histórico.
+        """
+        Move = self.env['commission.move']
+        Move.flush_model()
+        columns = ', '.join(ARCHIVE_COLUMNS)
+        self.env.cr.execute(f"""
+            WITH moved AS (
+                DELETE FROM commission_move
+                 WHERE id IN (
+                        SELECT id FROM commission_move
+                         WHERE state IN ('invoiced', 'cancel')
+                           AND date < %s
+                         ORDER BY id
+                         LIMIT %s
+                           FOR UPDATE SKIP LOCKED)
+                RETURNING id, {columns}
+            )
+            INSERT INTO commission_move_archive (move_id, {columns}, archive_date)
+            SELECT id, {columns}, now() at time zone 'UTC' FROM moved
+        """, [before_date, limit])
+        count = self.env.cr.rowcount
+        if count:
+            Move.invalidate_model()
+            self.env['commission.settlement'].invalidate_model(['move_ids'])
+        return count
+
+    @api.model
+    def _cron_archive_moves(self):
+        years = int(self.env['ir.config_parameter'].sudo().get_param(ARCHIVE_YEARS_PARAM) or 0)
+        if years <= 0:
+            return
+        before_date = fields.Date.subtract(fields.Date.context_today(self), years=years)
+        total = 0
+        while True:
+            count = self._archive_moves(before_date)
+            if not count:
+                break
+            total += count
+            self.env.cr.commit()
+        _logger.info("[COMM] archivo: %s movimientos anteriores a %s archivados", total, before_date)
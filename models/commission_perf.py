@@ -0,0 +1,105 @@
+from odoo import models, fields, api
+from contextlib import contextmanager
+import logging
+import time
+
+_logger = logging.getLogger(__name__)
+
+PERF_PARAM = 'om_advanced_commission.perf_stats'
+
+
+class CommissionProfiler:
+    """Mide fases, consultas SQL y filas de una operación del motor de comisiones.
+
+    Uso::
+
+        with CommissionProfiler(env, 'generation') as prof:
+            with prof.phase('so_resolution'):
+                ...
+            prof.rows = len(moves)
+
+    Medir es barato (un ``perf_counter`` y un contador del cursor por fase);
+    solo se persiste en ``commission.perf.stat`` si el parámetro
+    ``om_advanced_commission.perf_stats`` está activo, y solo se registra en
+    el log si el nivel DEBUG está habilitado.
+    """
+
+    def __init__(self, env, operation):
+        self.env = env
+        self.operation = operation
+        self.phases = {}
+        self.rows = 0
+        self.records = 0
+
+    def _query_count(self):
+        return getattr(self.env.cr, 'sql_log_count', 0)
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        self._start_queries = self._query_count()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration = (time.perf_counter() - self._start) * 1000.0
+        queries = self._query_count() - self._start_queries
+        if _logger.isEnabledFor(logging.DEBUG):
+            _logger.debug(
+                "[COMM] perf %s: %.1f ms, %s consultas, %s filas, fases=%s",
+                self.operation, duration, queries, self.rows, self.phases,
+            )
+        if exc_type is None and self.env['ir.config_parameter'].sudo().get_param(PERF_PARAM):
+            self.env['commission.perf.stat'].sudo().create({
+                'operation': self.operation,
+                'duration_ms': duration,
+                'query_count': queries,
+                'rows': self.rows,
+                'records': self.records,
+                'phases': self.phases,
+            })
+        return False
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        start_queries = self._query_count()
+        try:
+            yield
+        finally:
+            stats = self.phases.setdefault(name, {'ms': 0.0, 'queries': 0})
+            stats['ms'] += round((time.perf_counter() - start) * 1000.0, 2)
+            stats['queries'] += self._query_count() - start_queries
+
+
+class CommissionPerfStat(models.Model):
+    _name = 'commission.perf.stat'
+    _description = 'Métrica de Rendimiento de Comisiones'
+    _order = 'id desc'
+
+    operation = fields.Selection([
+        ('generation', 'Generación (Conciliaciones)'),
+        ('recalc', 'Recálculo de Orden'),
+        ('settlement', 'Liquidación Masiva'),
+        ('bill', 'Facturas de Proveedor'),
+        ('report', 'Reporte'),
+    ], string='Operación', required=True, readonly=True, index=True)
+    duration_ms = fields.Float(string='Duración (ms)', readonly=True, aggregator='avg')
+    query_count = fields.Integer(string='Consultas SQL', readonly=True, aggregator='avg')
+    rows = fields.Integer(string='Filas Producidas', readonly=True)
+    records = fields.Integer(string='Registros de Entrada', readonly=True)
+    phases = fields.Json(string='Fases', readonly=True)
+    phases_display = fields.Text(string='Detalle de Fases', compute='_compute_phases_display')
+    user_id = fields.Many2one('res.users', string='Usuario', readonly=True,
+                              default=lambda self: self.env.user)
+
+    @api.depends('phases')
+    def _compute_phases_display(self):
+        for stat in self:
+            stat.phases_display = '\n'.join(
+                f"{name}: {values['ms']:.1f} ms, {values['queries']} consultas"
+                for name, values in (stat.phases or {}).items()
+            )
+
+    @api.autovacuum
+    def _gc_old_stats(self):
+        limit = fields.Datetime.subtract(fields.Datetime.now(), days=30)
+        self.search([('create_date', '<', limit)]).unlink()
@@ -0,0 +1,107 @@
+from odoo import models, fields, api
+import logging
+
+from .commission_rate_cache import CommissionRateCache
+
+_logger = logging.getLogger(__name__)
+
+QUEUE_MAX_ATTEMPTS = 5
+QUEUE_DEFAULT_CHUNK = 500
+
+
+class CommissionPartialQueue(models.Model):
+    _name = 'commission.partial.queue'
+    _description = 'Cola de Conciliaciones Pendientes de Comisión'
+    _order = 'id'
+
+    partial_id = fields.Many2one('account.partial.reconcile', string='Conciliación',
+                                 required=True, ondelete='cascade', index=True)
+    state = fields.Selection([
+        ('pending', 'Pendiente'),
+        ('done', 'Procesado'),
+        ('error', 'Error'),
+    ], default='pending', required=True, string='Estado', index=True)
+    attempts = fields.Integer(string='Intentos', default=0)
+    last_error = fields.Text(string='Último Error', readonly=True)
+    processed_date = fields.Datetime(string='Procesado el', readonly=True)
+
+    _unique_partial = models.Constraint(
+        'UNIQUE(partial_id)',
+        'La conciliación ya está en la cola de comisiones.',
+    )
+
+    @api.model
+    def _enqueue(self, partials):
+        """Encola partials sin calcular nada: una sola inserción por lote."""
+        if not partials:
+            return
+        self.env.cr.execute("""
+            INSERT INTO commission_partial_queue
+                (partial_id, state, attempts, create_uid, write_uid, create_date, write_date)
+            SELECT p, 'pending', 0, %(uid)s, %(uid)s, now() at time zone 'UTC', now() at time zone 'UTC'
+              FROM unnest(%(ids)s) AS p
+            ON CONFLICT (partial_id) DO NOTHING
+        """, {'uid': self.env.uid, 'ids': partials.ids})
+
+    @api.model
+    def _claim_chunk(self, limit, exclude_ids=()):
+        self.env.cr.execute("""
+            SELECT id FROM commission_partial_queue
+             WHERE state = 'pending'
+               AND NOT (id = ANY(%s))
+             ORDER BY id
+             LIMIT %s
+               FOR UPDATE SKIP LOCKED
+        """, [list(exclude_ids), limit])
+        return self.browse([r[0] for r in self.env.cr.fetchall()])
+
+    def _process(self):
+        """Genera las comisiones del lote; si falla, aísla partial por partial."""
+        Partial = self.env['account.partial.reconcile'].sudo().with_context(commission_raise_errors=True)
+        try:
+            with self.env.cr.savepoint():
+                Partial.browse(self.partial_id.ids)._create_commission_moves()
+            self._mark_done()
+            return
+        except Exception:
+            _logger.warning("[COMM] cola: lote de %s falló, reintentando individualmente", len(self))
+
+        for item in self:
+            try:
+                with self.env.cr.savepoint():
+                    Partial.browse(item.partial_id.id)._create_commission_moves()
+                item._mark_done()
+            except Exception as e:
+                attempts = item.attempts + 1
+                item.write({
+                    'attempts': attempts,
+                    'last_error': str(e),
+                    'state': 'error' if attempts >= QUEUE_MAX_ATTEMPTS else 'pending',
+                })
+                _logger.error("[COMM] cola: partial %s intento %s: %s", item.partial_id.id, attempts, e)
+
+    def _mark_done(self):
+        self.write({'state': 'done', 'processed_date': fields.Datetime.now(), 'last_error': False})
+
+    @api.model
+    def _cron_process_queue(self, chunk_size=None):
+        if not chunk_size:
+            param = self.env['ir.config_parameter'].sudo().get_param(
+                'om_advanced_commission.queue_chunk_size')
+            chunk_size = int(param or 0) or QUEUE_DEFAULT_CHUNK
+
+        processed = set()
+        while True:
+            # Los que vuelven a quedar pendientes tras un error esperan a la siguiente ejecución
+            chunk = self._claim_chunk(chunk_size, processed)
+            if not chunk:
+                break
+            processed.update(chunk.ids)
+            chunk._process()
+            self.env.cr.commit()
+            # Las tasas se vuelven a leer en cada lote confirmado
+            CommissionRateCache.clear(self.env)
+            _logger.info("[COMM] cola: procesadas %s conciliaciones", len(chunk))
+
+    def action_retry(self):
+        self.write({'state': 'pending', 'attempts': 0})
@@ -0,0 +1,53 @@
+from odoo import fields
+
+CR_CACHE_KEY = 'om_advanced_commission.rate_cache'
+
+
+class CommissionRateCache:
+    """Memoiza tasas de conversión por (moneda origen, moneda destino, compañía, fecha).
+
+    Replica ``res.currency._convert`` pero consultando las tablas de tasas una
+    sola vez por combinación. Se guarda en ``cr.cache``, que sobrevive a los
+    ``commit()`` del cursor: los crons que confirman por lotes llaman a
+    ``clear`` tras cada commit para leer las tasas editadas entre lotes.
+    """
+
+    def __init__(self, env):
+        self.env = env
+        self._rates = {}
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def get(cls, env):
+        cache = env.cr.cache.get(CR_CACHE_KEY)
+        if cache is None:
+            cache = env.cr.cache[CR_CACHE_KEY] = cls(env)
+        return cache
+
+    @classmethod
+    def clear(cls, env):
+        env.cr.cache.pop(CR_CACHE_KEY, None)
+
+    def rate(self, from_currency, to_currency, company, date):
+        if from_currency == to_currency:
+            return 1.0
+        date = fields.Date.to_date(date) or fields.Date.context_today(from_currency)
+        key = (from_currency.id, to_currency.id, company.id, date)
+        if key in self._rates:
+            self.hits += 1
+        else:
+            self.misses += 1
+            self._rates[key] = self.env['res.currency']._get_conversion_rate(
+                from_currency, to_currency, company, date)
+        return self._rates[key]
+
+    def convert(self, amount, from_currency, to_currency, company, date, round=True):
+        if from_currency == to_currency:
+            to_amount = amount
+        else:
+            to_amount = amount * self.rate(from_currency, to_currency, company, date)
+        return to_currency.round(to_amount) if round else to_amount
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'rates': len(self._rates)}
@@ -0,0 +1,177 @@
+from odoo import models, fields, api
+import logging
+
+from .commission_rate_cache import CommissionRateCache
+
+_logger = logging.getLogger(__name__)
+
+RECALC_WORKER_CRONS = [
+    'om_advanced_commission.ir_cron_commission_recalc_worker_1',
+    'om_advanced_commission.ir_cron_commission_recalc_worker_2',
+    'om_advanced_commission.ir_cron_commission_recalc_worker_3',
+    'om_advanced_commission.ir_cron_commission_recalc_worker_4',
+]
+
+
+class CommissionRecalcJob(models.Model):
+    _name = 'commission.recalc.job'
+    _description = 'Recálculo Masivo de Comisiones'
+    _order = 'id desc'
+
+    name = fields.Char(string='Referencia', required=True, readonly=True)
+    domain = fields.Char(string='Dominio de Órdenes', readonly=True)
+    state = fields.Selection([
+        ('running', 'En Proceso'),
+        ('done', 'Terminado'),
+        ('error', 'Con Errores'),
+    ], string='Estado', compute='_compute_state')
+    partition_ids = fields.One2many('commission.recalc.partition', 'job_id', string='Particiones')
+    line_ids = fields.One2many('commission.recalc.line', 'job_id', string='Resultados')
+    order_count = fields.Integer(string='Órdenes', readonly=True)
+    progress = fields.Float(string='Progreso', compute='_compute_totals')
+    created_count = fields.Integer(string='Creadas', compute='_compute_totals')
+    updated_count = fields.Integer(string='Actualizadas', compute='_compute_totals')
+    cancelled_count = fields.Integer(string='Canceladas', compute='_compute_totals')
+    skipped_count = fields.Integer(string='Omitidas', compute='_compute_totals')
+    error_count = fields.Integer(string='Con Error', compute='_compute_totals')
+
+    # No almacenado: los workers solo escriben en sus particiones, nunca en la fila del trabajo
+    @api.depends('partition_ids.state')
+    def _compute_state(self):
+        for job in self:
+            states = set(job.partition_ids.mapped('state'))
+            if 'pending' in states:
+                job.state = 'running'
+            else:
+                job.state = 'error' if 'error' in states else 'done'
+
+    def _compute_totals(self):
+        totals = {job.id: [0, 0, 0, 0, 0] for job in self}
+        for job, is_skipped, is_error, created, updated, cancelled, count in self.env['commission.recalc.line']._read_group(
+            [('job_id', 'in', self.ids)], ['job_id', 'is_skipped', 'is_error'],
+            ['created:sum', 'updated:sum', 'cancelled:sum', '__count'],
+        ):
+            job_totals = totals[job.id]
+            job_totals[0] += created
+            job_totals[1] += updated
+            job_totals[2] += cancelled
+            if is_skipped:
+                job_totals[3] += count
+            if is_error:
+                job_totals[4] += count
+        for job in self:
+            (job.created_count, job.updated_count, job.cancelled_count,
+             job.skipped_count, job.error_count) = totals[job.id]
+            done = sum(len(p.order_ids) for p in job.partition_ids if p.state in ('done', 'error'))
+            job.progress = 100.0 * done / job.order_count if job.order_count else 0.0
+
+    @api.model
+    def _launch(self, orders, partition_size, domain=False):
+        """Crea el trabajo particionado y despierta a los workers."""
+        ids = orders.ids
+        job = self.create({
+            'name': f"RECALC-{fields.Datetime.now():%Y%m%d-%H%M%S}",
+            'domain': domain or False,
+            'order_count': len(ids),
+            'partition_ids': [
+                (0, 0, {'order_ids': [(6, 0, ids[start:start + partition_size])]})
+                for start in range(0, len(ids), partition_size)
+            ],
+        })
+        for xmlid in RECALC_WORKER_CRONS:
+            cron = self.env.ref(xmlid, raise_if_not_found=False)
+            if cron and cron.active:
+                cron._trigger()
+        return job
+
+
+class CommissionRecalcPartition(models.Model):
+    _name = 'commission.recalc.partition'
+    _description = 'Partición de Recálculo de Comisiones'
+    _order = 'id'
+
+    job_id = fields.Many2one('commission.recalc.job', required=True, ondelete='cascade', index=True)
+    order_ids = fields.Many2many('sale.order', string='Órdenes')
+    state = fields.Selection([
+        ('pending', 'Pendiente'),
+        ('done', 'Terminado'),
+        ('error', 'Error'),
+    ], default='pending', required=True, index=True)
+    last_error = fields.Text(string='Error', readonly=True)
+
+    @api.model
+    def _claim(self):
+        # SKIP LOCKED: cada worker (cron con su propio cursor) toma una partición distinta
+        self.env.cr.execute("""
+            SELECT id FROM commission_recalc_partition
+             WHERE state = 'pending'
+             ORDER BY id
+             LIMIT 1
+               FOR UPDATE SKIP LOCKED
+        """)
+        row = self.env.cr.fetchone()
+        return self.browse(row[0]) if row else self.browse()
+
+    def _process(self):
+        """Recalcula la partición orden por orden, cada una en su savepoint.
+
+        Una orden que falla solo revierte sus propios cambios y deja una línea
+        con el error; la partición termina en 'error' si alguna falló.
+        """
+        self.ensure_one()
+        vals_list = []
+        last_error = False
+        for so in self.order_ids:
+            try:
+                with self.env.cr.savepoint():
+                    result = so._recalc_commissions_batch()[0]
+            except Exception as e:
+                _logger.error("[COMM] recálculo: orden %s de la partición %s falló: %s",
+                              so.id, self.id, e, exc_info=True)
+                last_error = str(e)
+                vals_list.append({
+                    'job_id': self.job_id.id,
+                    'sale_order_id': so.id,
+                    'is_error': True,
+                    'message': last_error,
+                })
+                continue
+            vals_list.append({
+                'job_id': self.job_id.id,
+                'sale_order_id': result['sale_order_id'],
+                'created': result['created'],
+                'updated': result['updated'],
+                'cancelled': result['cancelled'],
+                'unchanged': result['unchanged'],
+                'is_skipped': bool(result['skipped']),
+                'message': result['skipped'] or False,
+            })
+        self.env['commission.recalc.line'].create(vals_list)
+        self.write({'state': 'error' if last_error else 'done', 'last_error': last_error})
+
+    @api.model
+    def _cron_process_partitions(self):
+        while True:
+            partition = self._claim()
+            if not partition:
+                break
+            partition._process()
+            self.env.cr.commit()
+            # Las tasas se vuelven a leer en cada partición confirmada
+            CommissionRateCache.clear(self.env)
+
+
+class CommissionRecalcLine(models.Model):
+    _name = 'commission.recalc.line'
+    _description = 'Resultado de Recálculo por Orden'
+    _order = 'id'
+
+    job_id = fields.Many2one('commission.recalc.job', required=True, ondelete='cascade', index=True)
+    sale_order_id = fields.Many2one('sale.order', string='Orden de Venta', ondelete='cascade')
+    created = fields.Integer(string='Creadas')
+    updated = fields.Integer(string='Actualizadas')
+    cancelled = fields.Integer(string='Canceladas')
+    unchanged = fields.Integer(string='Sin Cambios')
+    is_skipped = fields.Boolean(string='Omitida')
+    is_error = fields.Boolean(string='Error')
+    message = fields.Char(string='Motivo')
@@ -1,6 +1,9 @@
 from odoo import models, fields, api
 from odoo.exceptions import ValidationError
 
+# Campos cuyo cambio crea una nueva versión de la regla (ver commission.move.snapshot)
+RULE_VERSION_FIELDS = {'partner_id', 'role_type', 'calculation_base', 'percent', 'fixed_amount'}
+
 
 class SaleCommissionRule(models.Model):
     _name = 'sale.commission.rule'
@@ -27,66 +30,107 @@ class SaleCommissionRule(models.Model):
     percent = fields.Float(string='Porcentaje %')
     fixed_amount = fields.Monetary(string='Monto Fijo', currency_field='currency_id')
 
-    estimated_amount = fields.Monetary(compute='_compute_estimated', string='Estimado Total')
+    estimated_amount = fields.Monetary(compute='_compute_estimated', string='Estimado Total', store=True)
     currency_id = fields.Many2one(related='sale_order_id.currency_id')
 
+    version = fields.Integer(string='Versión', default=1, readonly=True, copy=False,
+                             help='Aumenta con cada cambio de beneficiario, rol, base o monto de la regla.')
+
     requires_authorization = fields.Boolean(string='Requiere Autorización', default=False, readonly=True)
     authorization_id = fields.Many2one('commission.authorization', string='Autorización', readonly=True)
 
-    @api.depends('percent', 'fixed_amount', 'calculation_base',
-                 'sale_order_id.amount_untaxed', 'sale_order_id.amount_total',
-                 'sale_order_id.order_line.price_subtotal',
-                 'sale_order_id.commission_rule_ids.percent',
-                 'sale_order_id.commission_rule_ids.fixed_amount',
-                 'sale_order_id.commission_rule_ids.calculation_base',
-                 'sale_order_id.commission_rule_ids.role_type')
+    def write(self, vals):
+        res = super().write(vals)
+        if RULE_VERSION_FIELDS.intersection(vals) and self.ids:
+            self.env.cr.execute(
+                "UPDATE sale_commission_rule SET version = version + 1 WHERE id = ANY(%s)", [self.ids])
+            self.invalidate_recordset(['version'])
+        return res
+
+    def _estimated_depends(self):
+        depends = [
+            'percent', 'fixed_amount', 'calculation_base',
+            'sale_order_id.order_line.price_subtotal',
+            'sale_order_id.order_line.price_total',
+            'sale_order_id.order_line.no_commission',
+            'sale_order_id.commission_rule_ids.percent',
+            'sale_order_id.commission_rule_ids.fixed_amount',
+            'sale_order_id.commission_rule_ids.calculation_base',
+            'sale_order_id.commission_rule_ids.role_type',
+        ]
+        # El margen solo existe con sale_margin instalado; sin él la base 'margin' vale 0
+        line_fields = self.env['sale.order.line']._fields
+        if 'margin' in line_fields:
+            depends.append('sale_order_id.order_line.margin')
+        if 'purchase_price' in line_fields:
+            depends.append('sale_order_id.order_line.purchase_price')
+        if 'margin' in self.env['sale.order']._fields:
+            depends.append('sale_order_id.margin')
+        return depends
+
+    @api.depends(lambda self: self._estimated_depends())
     def _compute_estimated(self):
-        for rule in self:
-            so = rule.sale_order_id
-            amount = 0.0
-            lines = so.order_line.filtered(lambda l: not getattr(l, 'no_commission', False))
-
-            if rule.calculation_base == 'manual':
-                amount = rule.fixed_amount
-
-            elif rule.calculation_base == 'amount_untaxed':
-                base = sum(lines.mapped('price_subtotal'))
-                amount = base * (rule.percent / 100.0)
-
-            elif rule.calculation_base == 'amount_total':
-                base = sum(lines.mapped('price_total'))
-                amount = base * (rule.percent / 100.0)
-
-            elif rule.calculation_base == 'margin':
-                base = 0.0
-                try:
-                    if lines and 'margin' in lines[0]._fields:
-                        base = sum(lines.mapped('margin'))
-                    elif 'margin' in so._fields:
-                        base = so.margin
-                except (AttributeError, KeyError):
-                    base = 0.0
-                amount = base * (rule.percent / 100.0)
-
-            elif rule.calculation_base == 'gross_utility':
-                # Utilidad bruta = Subtotal - todas las comisiones externas
-                # (arquitectos, constructoras, referidores, y otros vendedores internos)
-                subtotal = sum(lines.mapped('price_subtotal'))
-
-                # Sumar comisiones de roles NO internos (arquitecto, constructora, referidor)
-                external_commission = 0.0
-                for other in so.commission_rule_ids:
-                    if other.id == rule.id:
-                        continue
-                    if other.role_type != 'internal':
-                        if other.calculation_base == 'manual':
-                            external_commission += other.fixed_amount
-                        elif other.calculation_base in ('amount_untaxed', 'gross_utility'):
-                            external_commission += subtotal * (other.percent / 100.0)
-                        elif other.calculation_base == 'amount_total':
-                            external_commission += sum(lines.mapped('price_total')) * (other.percent / 100.0)
-
-                gross_utility = subtotal - external_commission
-                amount = gross_utility * (rule.percent / 100.0)
-
-            rule.estimated_amount = amount
\ No newline at end of file
+        # Agregados por orden: se calculan una vez y se reutilizan en todas sus reglas
+        for so, rules in self.grouped('sale_order_id').items():
+            agg = self._get_order_aggregates(so)
+            for rule in rules:
+                rule.estimated_amount = rule._estimate_from_aggregates(agg)
+
+    @api.model
+    def _get_order_aggregates(self, so):
+        lines = so.order_line.filtered(lambda l: not getattr(l, 'no_commission', False))
+        subtotal = sum(lines.mapped('price_subtotal'))
+        total = sum(lines.mapped('price_total'))
+
+        margin = 0.0
+        try:
+            if lines and 'margin' in lines[0]._fields:
+                margin = sum(lines.mapped('margin'))
+            elif 'margin' in so._fields:
+                margin = so.margin
+        except (AttributeError, KeyError):
+            margin = 0.0
+
+        # Comisiones de roles NO internos (arquitecto, constructora, referidor),
+        # por regla para poder descontar la propia en gross_utility
+        external = {}
+        for other in so.commission_rule_ids:
+            if other.role_type != 'internal':
+                external[other] = self._external_commission(other, subtotal, total)
+
+        return {
+            'subtotal': subtotal,
+            'total': total,
+            'margin': margin,
+            'external': external,
+            'external_total': sum(external.values()),
+        }
+
+    @api.model
+    def _external_commission(self, rule, subtotal, total):
+        if rule.calculation_base == 'manual':
+            return rule.fixed_amount
+        if rule.calculation_base in ('amount_untaxed', 'gross_utility'):
+            return subtotal * (rule.percent / 100.0)
+        if rule.calculation_base == 'amount_total':
+            return total * (rule.percent / 100.0)
+        return 0.0
+
+    def _estimate_from_aggregates(self, agg):
+        self.ensure_one()
+        pct = self.percent / 100.0
+
+        if self.calculation_base == 'manual':
+            return self.fixed_amount
+        if self.calculation_base == 'amount_untaxed':
+            return agg['subtotal'] * pct
+        if self.calculation_base == 'amount_total':
+            return agg['total'] * pct
+        if self.calculation_base == 'margin':
+            return agg['margin'] * pct
+        if self.calculation_base == 'gross_utility':
+            # Utilidad bruta = Subtotal - todas las comisiones externas
+            # (arquitectos, constructoras, referidores), sin contar la propia regla
+            external_commission = agg['external_total'] - agg['external'].get(self, 0.0)
+            return (agg['subtotal'] - external_commission) * pct
+        return 0.0
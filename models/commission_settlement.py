@@ -1,5 +1,8 @@
 from odoo import models, fields, api
-from odoo.exceptions import ValidationError
+from odoo.exceptions import UserError, ValidationError
+
+from .commission_perf import CommissionProfiler
+
 
 class CommissionSettlement(models.Model):
     _name = 'commission.settlement'
@@ -17,6 +20,7 @@ class CommissionSettlement(models.Model):
     currency_id = fields.Many2one('res.currency', required=True, default=lambda self: self.env.company.currency_id)
     
     vendor_bill_id = fields.Many2one('account.move', string='Factura Proveedor Generada')
+    run_id = fields.Many2one('commission.settlement.run', string='Ejecución Masiva', readonly=True, index=True)
     
     state = fields.Selection([
         ('draft', 'Borrador'),
@@ -31,14 +35,12 @@ class CommissionSettlement(models.Model):
             rec.total_amount = sum(rec.move_ids.mapped('amount'))
 
     def action_approve(self):
-        self.write({'state': 'approved'})
+        # Desde la lista pueden llegar liquidaciones ya facturadas o canceladas
+        self.filtered(lambda s: s.state == 'draft').write({'state': 'approved'})
 
-    def action_create_bill(self):
-        self.ensure_one()
-        
-        if self.vendor_bill_id:
-            raise ValidationError("Ya existe una factura de proveedor para esta liquidación.")
-        
+    @api.model
+    def _get_bill_config(self):
+        """Lee y valida una sola vez el producto y diario de comisiones."""
         param_obj = self.env['ir.config_parameter'].sudo()
         prod_id_str = param_obj.get_param('om_advanced_commission.default_commission_product_id')
         journal_id_str = param_obj.get_param('om_advanced_commission.default_commission_journal_id')
@@ -54,34 +56,97 @@ class CommissionSettlement(models.Model):
 
         product = self.env['product.product'].browse(product_id).exists()
         journal = self.env['account.journal'].browse(journal_id).exists()
-        
+
         if not product or not journal:
             raise ValidationError("El producto o diario configurado ya no existe.")
-        
-        if journal.company_id != self.company_id:
-            raise ValidationError(f"El diario {journal.name} no pertenece a la compañía {self.company_id.name}.")
+        return product, journal
 
-        bill = self.env['account.move'].create({
+    def _prepare_bill_vals(self, product, journal):
+        self.ensure_one()
+        return {
             'move_type': 'in_invoice',
             'partner_id': self.partner_id.id,
             'company_id': self.company_id.id,
             'invoice_date': fields.Date.today(),
-            'journal_id': journal_id,
+            'journal_id': journal.id,
             'currency_id': self.currency_id.id,
             'invoice_line_ids': [(0, 0, {
-                'product_id': product_id,
+                'product_id': product.id,
                 'name': f"Liquidación Comisiones Ref: {self.name}",
                 'quantity': 1,
                 'price_unit': self.total_amount,
             })]
-        })
-        self.vendor_bill_id = bill.id
-        self.state = 'invoiced'
-        self.move_ids.write({'state': 'invoiced'})
-        
+        }
+
+    def _create_bills(self):
+        """Genera las facturas de proveedor de las liquidaciones aprobadas en bloque."""
+        settlements = self.filtered(lambda s: s.state == 'approved')
+        if not settlements:
+            return self.env['account.move']
+
+        already = settlements.filtered('vendor_bill_id')
+        if already:
+            raise ValidationError(
+                f"Ya existe una factura de proveedor para: {', '.join(already.mapped('name'))}."
+            )
+
+        product, journal = self._get_bill_config()
+        wrong_company = settlements.filtered(lambda s: s.company_id != journal.company_id)
+        if wrong_company:
+            raise ValidationError(
+                f"El diario {journal.name} no pertenece a la compañía {wrong_company[0].company_id.name}."
+            )
+
+        with CommissionProfiler(self.env, 'bill') as profiler:
+            profiler.records = len(settlements)
+            with profiler.phase('insert'):
+                bills = self.env['account.move'].create([
+                    s._prepare_bill_vals(product, journal) for s in settlements
+                ])
+            with profiler.phase('assign'):
+                # Un solo write para el estado (seguimiento y saldos) y un UPDATE
+                # agrupado para la factura, distinta en cada liquidación
+                settlements.write({'state': 'invoiced'})
+                settlements.flush_recordset(['vendor_bill_id'])
+                self.env.cr.execute("""
+                    UPDATE commission_settlement s
+                       SET vendor_bill_id = v.bill_id,
+                           write_uid = %s,
+                           write_date = now() at time zone 'UTC'
+                      FROM unnest(%s::int[], %s::int[]) AS v(settlement_id, bill_id)
+                     WHERE s.id = v.settlement_id
+                """, [self.env.uid, settlements.ids, bills.ids])
+                settlements.invalidate_recordset(['vendor_bill_id'])
+                settlements.modified(['vendor_bill_id'])
+                settlements.move_ids.write({'state': 'invoiced'})
+            profiler.rows = len(bills)
+        return bills
+
+    def action_create_bill(self):
+        bills = self._create_bills()
+        if not bills:
+            raise UserError("Solo se pueden facturar liquidaciones aprobadas.")
+        if len(bills) == 1:
+            return {
+                'type': 'ir.actions.act_window',
+                'res_model': 'account.move',
+                'res_id': bills.id,
+                'view_mode': 'form',
+            }
         return {
             'type': 'ir.actions.act_window',
+            'name': 'Facturas de Comisiones',
             'res_model': 'account.move',
-            'res_id': bill.id,
-            'view_mode': 'form',
-        }
\ No newline at end of file
+            'view_mode': 'list,form',
+            'domain': [('id', 'in', bills.ids)],
+        }
+
+    @api.model
+    def _cron_create_bills(self):
+        _product, journal = self._get_bill_config()
+        settlements = self.search([
+            ('state', '=', 'approved'),
+            ('vendor_bill_id', '=', False),
+            ('company_id', '=', journal.company_id.id),
+        ])
+        settlements._create_bills()
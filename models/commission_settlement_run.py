@@ -0,0 +1,153 @@
+from odoo import models, fields, api
+from odoo.exceptions import UserError
+import logging
+
+from .commission_rate_cache import CommissionRateCache
+
+_logger = logging.getLogger(__name__)
+
+RUN_DEFAULT_CHUNK = 50
+
+
+class CommissionSettlementRun(models.Model):
+    _name = 'commission.settlement.run'
+    _description = 'Ejecución de Liquidación Masiva'
+    _inherit = ['mail.thread']
+    _order = 'id desc'
+
+    name = fields.Char(string='Referencia', required=True, default='Nueva Ejecución', copy=False)
+    date_to = fields.Date(string='Hasta fecha', required=True, default=fields.Date.context_today)
+    partner_ids = fields.Many2many('res.partner', string='Comisionistas',
+                                   help='Dejar vacío para liquidar a todos los comisionistas.')
+    chunk_size = fields.Integer(string='Comisionistas por Lote', default=RUN_DEFAULT_CHUNK)
+    state = fields.Selection([
+        ('draft', 'Borrador'),
+        ('queued', 'En Cola'),
+        ('running', 'En Proceso'),
+        ('done', 'Terminado'),
+        ('error', 'Con Errores'),
+    ], default='draft', string='Estado', tracking=True)
+
+    total_partners = fields.Integer(string='Comisionistas Totales', readonly=True)
+    done_partners = fields.Integer(string='Comisionistas Procesados', readonly=True)
+    moves_settled = fields.Integer(string='Movimientos Liquidados', readonly=True)
+    error_count = fields.Integer(string='Errores', readonly=True)
+    last_error = fields.Text(string='Último Error', readonly=True)
+    failed_partner_ids = fields.Many2many('res.partner', 'commission_settlement_run_failed_partner_rel',
+                                          string='Comisionistas con Error', readonly=True)
+    progress = fields.Float(string='Progreso', compute='_compute_progress')
+    settlement_ids = fields.One2many('commission.settlement', 'run_id', string='Liquidaciones')
+    company_id = fields.Many2one('res.company', required=True, default=lambda self: self.env.company)
+
+    @api.depends('total_partners', 'done_partners')
+    def _compute_progress(self):
+        for run in self:
+            run.progress = 100.0 * run.done_partners / run.total_partners if run.total_partners else 0.0
+
+    def _get_move_domain(self):
+        self.ensure_one()
+        # El cron corre como superusuario: sin este filtro se liquidarían todas las compañías
+        domain = [('state', '=', 'draft'), ('date', '<=', self.date_to),
+                  ('company_id', '=', self.company_id.id)]
+        if self.partner_ids:
+            domain.append(('partner_id', 'in', self.partner_ids.ids))
+        return domain
+
+    def _remaining_partner_ids(self):
+        """Comisionistas con movimientos aún en draft, excluyendo los fallidos.
+
+        Se recalcula en cada lote a partir de la BD: lo ya liquidado deja de
+        estar en draft, así que reanudar nunca liquida dos veces.
+        """
+        self.ensure_one()
+        domain = self._get_move_domain()
+        if self.failed_partner_ids:
+            domain.append(('partner_id', 'not in', self.failed_partner_ids.ids))
+        groups = self.env['commission.move']._read_group(domain, ['partner_id'], order='partner_id')
+        return [partner.id for (partner,) in groups]
+
+    def action_start(self):
+        for run in self:
+            if run.state not in ('draft', 'error'):
+                raise UserError("Solo se pueden iniciar ejecuciones en borrador o con errores.")
+        self.filtered(lambda r: r.state == 'draft').write({'name': f"RUN-{fields.Date.today()}"})
+        self.write({
+            'state': 'queued',
+            'error_count': 0,
+            'last_error': False,
+            'failed_partner_ids': [(5, 0, 0)],
+        })
+        self.env.ref('om_advanced_commission.ir_cron_commission_settlement_run')._trigger()
+
+    def _process_chunk(self, partner_ids):
+        self.ensure_one()
+        Wizard = self.env['commission.make.invoice']
+        domain = self._get_move_domain() + [('partner_id', 'in', partner_ids)]
+        try:
+            with self.env.cr.savepoint():
+                settlements, move_count = Wizard._settle_moves(domain)
+                settlements.write({'run_id': self.id})
+        except Exception as e:
+            _logger.error("[COMM] ejecución %s: error en lote %s: %s", self.name, partner_ids, e, exc_info=True)
+            self.write({
+                'error_count': self.error_count + 1,
+                'last_error': str(e),
+                'failed_partner_ids': [(4, pid) for pid in partner_ids],
+                'done_partners': self.done_partners + len(partner_ids),
+            })
+            return
+        self.write({
+            'done_partners': self.done_partners + len(partner_ids),
+            'moves_settled': self.moves_settled + move_count,
+        })
+
+    def _run(self):
+        """Liquida por lotes de comisionistas, con commit tras cada lote."""
+        self.ensure_one()
+        if self.state == 'queued':
+            self.write({
+                'state': 'running',
+                'total_partners': len(self._remaining_partner_ids()),
+                'done_partners': 0,
+            })
+            self.env.cr.commit()
+
+        chunk_size = self.chunk_size or RUN_DEFAULT_CHUNK
+        while True:
+            remaining = self._remaining_partner_ids()
+            if not remaining:
+                break
+            self._process_chunk(remaining[:chunk_size])
+            self.env.cr.commit()
+            # Las tasas se vuelven a leer en cada lote confirmado
+            CommissionRateCache.clear(self.env)
+
+        self.write({'state': 'error' if self.error_count else 'done'})
+        self.env.cr.commit()
+        _logger.info("[COMM] ejecución %s: %s movimientos liquidados, %s errores",
+                     self.name, self.moves_settled, self.error_count)
+
+    @api.model
+    def _cron_process_runs(self):
+        # 'running' incluye ejecuciones interrumpidas por una caída: se reanudan
+        for run in self.search([('state', 'in', ('queued', 'running'))], order='id'):
+            run._run()
+
+    @api.model
+    def _cron_launch_month_end(self):
+        """Encola, por compañía, una liquidación de todos los comisionistas hasta hoy."""
+        today = fields.Date.context_today(self)
+        self.create([
+            {'date_to': today, 'company_id': company.id}
+            for company in self.env['res.company'].search([])
+        ]).action_start()
+
+    def action_view_settlements(self):
+        self.ensure_one()
+        return {
+            'type': 'ir.actions.act_window',
+            'name': 'Liquidaciones',
+            'res_model': 'commission.settlement',
+            'view_mode': 'list,form',
+            'domain': [('run_id', '=', self.id)],
+        }
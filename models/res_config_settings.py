@@ -1,4 +1,4 @@
-from odoo import models, fields
+from odoo import models, fields, api
 
 class ResConfigSettings(models.TransientModel):
     _inherit = 'res.config.settings'
@@ -15,3 +15,46 @@ class ResConfigSettings(models.TransientModel):
         config_parameter='om_advanced_commission.default_commission_journal_id',
         domain=[('type', '=', 'purchase')]
     )
+
+    commission_deferred_generation = fields.Boolean(
+        string='Generación Diferida de Comisiones',
+        config_parameter='om_advanced_commission.deferred_generation',
+        help='Las conciliaciones solo se encolan; un cron genera las comisiones por lotes.'
+    )
+    commission_queue_chunk_size = fields.Integer(
+        string='Tamaño de Lote de la Cola',
+        config_parameter='om_advanced_commission.queue_chunk_size',
+        default=500
+    )
+    commission_perf_stats = fields.Boolean(
+        string='Registrar Métricas de Rendimiento',
+        config_parameter='om_advanced_commission.perf_stats',
+        help='Guarda tiempos por fase, consultas y filas de generación, recálculo, liquidación y reporte.'
+    )
+    commission_archive_years = fields.Integer(
+        string='Archivar Comisiones tras (años)',
+        config_parameter='om_advanced_commission.archive_years',
+        help='Los movimientos facturados o cancelados con más antigüedad pasan a la tabla de archivo. 0 = desactivado.'
+    )
+    commission_sequence_no_gap = fields.Boolean(
+        string='Folios de Comisión sin Huecos',
+        compute='_compute_commission_sequence_no_gap', readonly=False,
+        help='Sin huecos bloquea la secuencia por lote; la estándar no bloquea pero puede dejar huecos.'
+    )
+
+    @api.depends('company_id')
+    def _compute_commission_sequence_no_gap(self):
+        seq = self.env.ref('om_advanced_commission.seq_commission_move', raise_if_not_found=False)
+        for rec in self:
+            rec.commission_sequence_no_gap = bool(seq) and seq.sudo().implementation == 'no_gap'
+
+    def set_values(self):
+        super().set_values()
+        seq = self.env.ref('om_advanced_commission.seq_commission_move', raise_if_not_found=False)
+        if seq:
+            seq = seq.sudo()
+            implementation = 'no_gap' if self.commission_sequence_no_gap else 'standard'
+            if seq.implementation != implementation:
+                # Conservar el siguiente folio: al pasar de estándar a sin huecos el
+                # contador vive en la secuencia PostgreSQL y number_next queda atrasado
+                seq.write({'implementation': implementation, 'number_next': seq.number_next_actual})
@@ -2,6 +2,8 @@ from odoo import models, fields, api
 from odoo.exceptions import UserError
 import logging
 
+from .commission_perf import CommissionProfiler
+
 _logger = logging.getLogger(__name__)
 
 SELLER_MAX_PCT = 2.5
@@ -28,6 +30,10 @@ class SaleOrder(models.Model):
         string='Requiere Autorización', compute='_compute_commission_requires_auth', store=True)
     commission_authorization_id = fields.Many2one(
         'commission.authorization', string='Autorización Vigente', readonly=True)
+    commission_authorization_ids = fields.One2many(
+        'commission.authorization', 'sale_order_id', string='Autorizaciones')
+    commission_auth_approved = fields.Boolean(
+        string='Autorización Aprobada', compute='_compute_commission_auth_approved', store=True)
 
     @api.model_create_multi
     def create(self, vals_list):
@@ -59,22 +65,28 @@ class SaleOrder(models.Model):
         for so in self:
             so.total_commission_percent = so.total_seller_percent
 
-    @api.depends('total_seller_percent', 'commission_authorization_id',
-                 'commission_authorization_id.state')
+    @api.depends('commission_authorization_ids.state')
+    def _compute_commission_auth_approved(self):
+        # Una sola consulta agrupada para todo el recordset
+        approved = {
+            so.id for (so,) in self.env['commission.authorization'].sudo()._read_group(
+                [('sale_order_id', 'in', self.ids), ('state', '=', 'approved')], ['sale_order_id'],
+            )
+        }
+        for so in self:
+            so.commission_auth_approved = so.id in approved
+
+    @api.depends('total_seller_percent', 'commission_auth_approved')
     def _compute_commission_requires_auth(self):
         for so in self:
-            if so.total_seller_percent <= SELLER_MAX_PCT:
-                so.commission_requires_auth = False
-                continue
-            auth_ok = so._has_approved_auth()
-            so.commission_requires_auth = not auth_ok
+            so.commission_requires_auth = (
+                so.total_seller_percent > SELLER_MAX_PCT and not so.commission_auth_approved
+            )
 
     def _has_approved_auth(self):
-        """Verifica en BD si existe autorización aprobada para esta SO."""
-        return bool(self.env['commission.authorization'].sudo().search_count([
-            ('sale_order_id', '=', self.id),
-            ('state', '=', 'approved'),
-        ], limit=1))
+        """Indica si la SO tiene una autorización aprobada (campo almacenado)."""
+        self.ensure_one()
+        return self.commission_auth_approved
 
     @api.onchange('seller1_id', 'seller2_id', 'seller3_id',
                   'seller1_percent', 'seller2_percent', 'seller3_percent')
@@ -120,24 +132,56 @@ class SaleOrder(models.Model):
         seller_fields = {'seller1_id', 'seller2_id', 'seller3_id',
                          'seller1_percent', 'seller2_percent', 'seller3_percent'}
         if seller_fields & set(vals.keys()):
-            for so in self:
-                old_internal = so.commission_rule_ids.filtered(lambda r: r.role_type == 'internal')
-                old_internal.unlink()
-                for partner, pct in [
-                    (so.seller1_id, so.seller1_percent),
-                    (so.seller2_id, so.seller2_percent),
-                    (so.seller3_id, so.seller3_percent),
-                ]:
-                    if partner and pct:
-                        self.env['sale.commission.rule'].create({
-                            'sale_order_id': so.id,
-                            'partner_id': partner.id,
-                            'role_type': 'internal',
-                            'calculation_base': 'gross_utility',
-                            'percent': pct,
-                        })
+            self._sync_internal_rules()
         return res
 
+    def _sync_internal_rules(self):
+        """Alinea las reglas internas con los vendedores de todo el recordset.
+
+        Compara las reglas existentes con las deseadas por orden y aplica solo
+        las diferencias: un unlink, un write por porcentaje distinto y un create.
+        El estimado se recalcula una sola vez al final, agrupado por orden.
+        """
+        existing = {}
+        for rule in self.commission_rule_ids:
+            if rule.role_type == 'internal':
+                existing.setdefault((rule.sale_order_id.id, rule.partner_id.id), []).append(rule)
+
+        Rule = self.env['sale.commission.rule']
+        to_unlink = Rule
+        to_update = {}
+        to_create = []
+        for so in self:
+            for partner, pct in [
+                (so.seller1_id, so.seller1_percent),
+                (so.seller2_id, so.seller2_percent),
+                (so.seller3_id, so.seller3_percent),
+            ]:
+                if not (partner and pct):
+                    continue
+                current = existing.get((so.id, partner.id))
+                if not current:
+                    to_create.append({
+                        'sale_order_id': so.id,
+                        'partner_id': partner.id,
+                        'role_type': 'internal',
+                        'calculation_base': 'gross_utility',
+                        'percent': pct,
+                    })
+                    continue
+                rule = current.pop(0)
+                if rule.percent != pct or rule.calculation_base != 'gross_utility':
+                    to_update[pct] = to_update.get(pct, Rule) | rule
+        for rules in existing.values():
+            for rule in rules:
+                to_unlink |= rule
+
+        to_unlink.unlink()
+        for pct, rules in to_update.items():
+            rules.write({'percent': pct, 'calculation_base': 'gross_utility'})
+        if to_create:
+            Rule.create(to_create)
+
     def action_request_commission_auth(self):
         self.ensure_one()
         return {
@@ -163,37 +207,127 @@ class SaleOrder(models.Model):
                     f"{SELLER_MAX_PCT}%. Obtén una autorización aprobada antes de recalcular."
                 )
 
-        CommissionMove = self.env['commission.move']
-
         if not self.commission_rule_ids:
             return self._return_notification("Faltan definir las Reglas de Comisión.", "danger")
 
-        invoices = self.invoice_ids.filtered(
-            lambda x: x.state == 'posted' and x.payment_state != 'not_paid'
-        )
+        invoices = self._get_commission_invoices()
         if not invoices:
             return self._return_notification("Sin facturas pagadas.", "warning")
 
-        old_drafts = CommissionMove.search([('sale_order_id', '=', self.id), ('state', '=', 'draft')])
-        old_drafts.unlink()
+        with CommissionProfiler(self.env, 'recalc') as profiler:
+            profiler.records = len(invoices)
+            diff = self._compute_commission_diff(invoices, profiler)
+            with profiler.phase('apply'):
+                summary = self._apply_commission_diff(diff)
+            profiler.rows = summary['created'] + summary['updated'] + summary['cancelled']
+        created_count = summary['created']
+        msg_type = "success" if created_count or summary['updated'] or summary['cancelled'] else "info"
+        return self._return_notification(
+            f"Recálculo finalizado. {created_count} comisiones creadas, "
+            f"{summary['updated']} actualizadas, {summary['cancelled']} canceladas.", msg_type)
 
-        created_count = 0
-        for inv in invoices:
-            receivable_lines = inv.line_ids.filtered(
-                lambda l: l.account_id.account_type == 'asset_receivable'
-            )
-            partials = self.env['account.partial.reconcile'].search([
-                '|',
-                ('debit_move_id', 'in', receivable_lines.ids),
-                ('credit_move_id', 'in', receivable_lines.ids),
-            ])
-            before_count = CommissionMove.search_count([('sale_order_id', '=', self.id)])
-            partials._create_commission_moves()
-            after_count = CommissionMove.search_count([('sale_order_id', '=', self.id)])
-            created_count += (after_count - before_count)
-
-        msg_type = "success" if created_count > 0 else "info"
-        return self._return_notification(f"Recálculo finalizado. {created_count} comisiones creadas.", msg_type)
+    def _get_commission_invoices(self):
+        self.ensure_one()
+        return self.invoice_ids.filtered(
+            lambda x: x.state == 'posted' and x.payment_state != 'not_paid'
+        )
+
+    def _recalc_commissions_batch(self):
+        """Recalcula varias órdenes sin interrumpirse por las que no aplican.
+
+        Devuelve una lista de dicts por orden con created/updated/cancelled/
+        unchanged y, si se omitió, el motivo en 'skipped'.
+        """
+        results = []
+        for so in self:
+            result = {'sale_order_id': so.id, 'created': 0, 'updated': 0,
+                      'cancelled': 0, 'unchanged': 0, 'skipped': False}
+            invoices = so._get_commission_invoices()
+            if so.total_seller_percent > SELLER_MAX_PCT and not so._has_approved_auth():
+                result['skipped'] = "Requiere autorización aprobada."
+            elif not so.commission_rule_ids:
+                result['skipped'] = "Faltan definir las Reglas de Comisión."
+            elif not invoices:
+                result['skipped'] = "Sin facturas pagadas."
+            else:
+                result.update(so._apply_commission_diff(so._compute_commission_diff(invoices)))
+            results.append(result)
+        return results
+
+    def _compute_commission_diff(self, invoices, profiler=None):
+        """Compara las comisiones objetivo de la orden con las existentes.
+
+        La clave es (conciliación, comisionista, SO). Solo los movimientos en
+        borrador (o cancelados que vuelven a aplicar) se actualizan; los ya
+        liquidados o facturados se respetan. Devuelve un dict con
+        'create' (lista de vals), 'update' ({movimiento: vals}), 'cancel'
+        (movimientos) y 'unchanged' (nº de movimientos sin cambios).
+        """
+        self.ensure_one()
+        # Igual que el motor: en sudo, para ver las comisiones de todos los comisionistas
+        CommissionMove = self.env['commission.move'].sudo()
+
+        receivable_lines = invoices.line_ids.filtered(
+            lambda l: l.account_id.account_type == 'asset_receivable'
+        )
+        partials = self.env['account.partial.reconcile'].sudo().search([
+            '|',
+            ('debit_move_id', 'in', receivable_lines.ids),
+            ('credit_move_id', 'in', receivable_lines.ids),
+        ])
+        target = {
+            (vals['partial_reconcile_id'], vals['partner_id'], vals['sale_order_id']): vals
+            for vals in partials._prepare_commission_move_vals(profiler)
+            if vals['sale_order_id'] == self.id
+        }
+
+        diff = {'create': [], 'update': {}, 'cancel': CommissionMove, 'unchanged': 0}
+        existing = {}
+        for move in CommissionMove.search([('sale_order_id', '=', self.id)]):
+            if not move.partial_reconcile_id:
+                # Conciliación deshecha (ondelete set null): todas comparten la
+                # clave (False, comisionista, SO), así que no entran al mapa
+                if move.state == 'draft':
+                    diff['cancel'] |= move
+                continue
+            existing[(move.partial_reconcile_id.id, move.partner_id.id, self.id)] = move
+
+        archived = self.env['commission.move.archive']._archived_keys(sale_order_id=self.id)
+
+        for key, vals in target.items():
+            move = existing.get(key)
+            if not move and key in archived:
+                diff['unchanged'] += 1
+            elif not move:
+                diff['create'].append(vals)
+            elif move.state in ('settled', 'invoiced'):
+                diff['unchanged'] += 1
+            elif move.state == 'cancel' or move._commission_vals_differ(vals):
+                diff['update'][move] = vals
+            else:
+                diff['unchanged'] += 1
+
+        for key, move in existing.items():
+            if key not in target and move.state == 'draft':
+                diff['cancel'] |= move
+        return diff
+
+    @api.model
+    def _apply_commission_diff(self, diff):
+        CommissionMove = self.env['commission.move'].sudo()
+        created = CommissionMove
+        if diff['create']:
+            # Una conciliación en vivo pudo crear la misma clave entre el diff y el alta
+            created, _skipped = CommissionMove._create_or_skip(diff['create'])
+        for move, vals in diff['update'].items():
+            move.write(vals)
+        diff['cancel'].write({'state': 'cancel'})
+        return {
+            'created': len(created),
+            'updated': len(diff['update']),
+            'cancelled': len(diff['cancel']),
+            'unchanged': diff['unchanged'],
+        }
 
     def _return_notification(self, message, type='info'):
         return {
@@ -1,10 +1,111 @@
 from odoo import models, api
 
+from ..models.commission_perf import CommissionProfiler
+
+# Comisionistas leídos por bloque: acota la memoria del worker en rangos grandes
+REPORT_PARTNER_CHUNK = 50
+
 
 class ReportCommissionPDF(models.AbstractModel):
     _name = 'report.om_advanced_commission.report_commission_document'
     _description = 'Lógica de Reporte de Comisiones'
 
+    @api.model
+    def _get_report_domain(self, date_from, date_to, partner_ids=None):
+        domain = [
+            ('date', '>=', date_from),
+            ('date', '<=', date_to),
+            ('state', '!=', 'cancel'),
+            ('company_id', '=', self.env.company.id),
+        ]
+        if partner_ids:
+            domain.append(('partner_id', 'in', partner_ids))
+        return domain
+
+    @api.model
+    def _get_partner_totals(self, domain):
+        """Totales por comisionista calculados en SQL, en orden de nombre."""
+        groups = self.env['commission.move']._read_group(
+            domain, ['partner_id', 'currency_id'],
+            ['base_amount_paid:sum', 'amount:sum'],
+            order='partner_id, currency_id',
+        )
+        totals = {}
+        for partner, currency, total_base, total_commission in groups:
+            if partner.id not in totals:
+                totals[partner.id] = {
+                    'partner_id': partner.id,
+                    'partner_name': partner.name,
+                    'currency': currency,
+                    'moves': [],
+                    'total_base': 0.0,
+                    'total_commission': 0.0,
+                }
+            totals[partner.id]['total_base'] += total_base
+            totals[partner.id]['total_commission'] += total_commission
+        return totals
+
+    @api.model
+    def _get_move_rows(self, domain):
+        """Filas planas del reporte, con todos los campos relacionados precargados."""
+        moves = self.env['commission.move'].search_fetch(
+            domain,
+            ['partner_id', 'sale_order_id', 'invoice_line_id', 'payment_id',
+             'date', 'base_amount_paid', 'amount', 'state'],
+            order='partner_id, date, id',
+        )
+        # Una lectura por modelo relacionado en lugar de una por fila
+        moves.partner_id.fetch(['name'])
+        moves.sale_order_id.fetch(['name', 'partner_id', 'x_project_id'])
+        moves.sale_order_id.partner_id.fetch(['name'])
+        moves.sale_order_id.x_project_id.fetch(['name'])
+        moves.invoice_line_id.fetch(['move_id'])
+        moves.invoice_line_id.move_id.fetch(['name', 'invoice_date'])
+        moves.payment_id.fetch(['date'])
+
+        rows = []
+        for move in moves:
+            so = move.sale_order_id
+            invoice = move.invoice_line_id.move_id
+            base = move.base_amount_paid
+            rows.append({
+                'id': move.id,
+                'partner_id': move.partner_id.id,
+                'partner_name': move.partner_id.name,
+                'state': move.state,
+                'so_name': so.name or '',
+                'customer_name': so.partner_id.name or '',
+                'project_name': so.x_project_id.name or False,
+                'invoice_name': invoice.name or False,
+                'invoice_date': invoice.invoice_date or False,
+                'payment_date': move.payment_id.date or move.date,
+                'base_amount_paid': base,
+                'amount': move.amount,
+                'percent': abs(round((move.amount / base) * 100, 2)) if base else False,
+            })
+        return rows
+
+    @api.model
+    def _get_report_docs(self, domain):
+        """Grupos por comisionista con totales SQL y filas planas.
+
+        Las filas se leen por bloques de comisionistas y la caché del ORM se
+        vacía tras cada bloque, para no retener todos los registros a la vez.
+        """
+        with CommissionProfiler(self.env, 'report') as profiler:
+            with profiler.phase('totals'):
+                totals = self._get_partner_totals(domain)
+            partner_ids = list(totals)
+            with profiler.phase('rows'):
+                for start in range(0, len(partner_ids), REPORT_PARTNER_CHUNK):
+                    chunk = partner_ids[start:start + REPORT_PARTNER_CHUNK]
+                    for row in self._get_move_rows(domain + [('partner_id', 'in', chunk)]):
+                        totals[row['partner_id']]['moves'].append(row)
+                        profiler.rows += 1
+                    self.env.invalidate_all()
+            profiler.records = len(partner_ids)
+        return list(totals.values())
+
     @api.model
     def _get_report_values(self, docids, data=None):
         data = data or {}
@@ -21,36 +122,11 @@ class ReportCommissionPDF(models.AbstractModel):
                 'company': self.env.company,
             }
 
-        domain = [
-            ('date', '>=', date_from),
-            ('date', '<=', date_to),
-            ('state', '!=', 'cancel'),
-            ('company_id', '=', self.env.company.id),
-        ]
-        if partner_ids:
-            domain.append(('partner_id', 'in', partner_ids))
-
-        moves = self.env['commission.move'].search(domain, order='partner_id, date, id')
-
-        grouped_data = {}
-        for move in moves:
-            partner = move.partner_id
-            if partner.id not in grouped_data:
-                grouped_data[partner.id] = {
-                    'partner': partner,
-                    'currency': move.currency_id,
-                    'moves': [],
-                    'total_base': 0.0,
-                    'total_commission': 0.0,
-                }
-            grouped_data[partner.id]['moves'].append(move)
-            grouped_data[partner.id]['total_base'] += move.base_amount_paid
-            grouped_data[partner.id]['total_commission'] += move.amount
-
+        domain = self._get_report_domain(date_from, date_to, partner_ids)
         return {
             'doc_ids': docids,
             'doc_model': 'commission.report.wizard',
             'data': data,
-            'docs': grouped_data.values(),
+            'docs': self._get_report_docs(domain),
             'company': self.env.company,
-        }
\ No newline at end of file
+        }
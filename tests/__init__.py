@@ -0,0 +1 @@
+from . import test_commission_performance
@@ -0,0 +1,175 @@
+import io
+import unittest
+
+from odoo import fields
+from odoo.tools import config
+from odoo.tests import tagged
+
+from odoo.addons.account.tests.common import AccountTestInvoicingCommon
+
+LOCAL_DB_HOSTS = ('localhost', '127.0.0.1', '::1')
+
+
+@tagged('post_install', '-at_install', 'commission_perf')
+class TestCommissionPerformance(AccountTestInvoicingCommon):
+    """Líneas base de consultas SQL de los caminos críticos del motor.
+
+    Escenario sintético: ORDER_COUNT órdenes con RULE_COUNT reglas cada una,
+    facturadas y pagadas en INSTALLMENT_COUNT parcialidades que alternan la
+    moneda de la compañía y una moneda extranjera. Las líneas base valen para
+    esta escala; una subclase que cambie la escala debe declarar las suyas.
+
+    Ejecutar con ``--test-tags commission_perf`` contra un PostgreSQL local.
+    """
+
+    ORDER_COUNT = 10
+    RULE_COUNT = 3
+    INSTALLMENT_COUNT = 3
+
+    # Consultas máximas por operación; una regresión hace fallar la prueba
+    QUERY_BASELINES = {
+        'generation': 120,
+        'recalc': 260,
+        'settlement': 40,
+        'bill': 220,
+        'report': 30,
+        'export': 30,
+    }
+
+    @classmethod
+    def setUpClass(cls):
+        # Los datos sintéticos consumen secuencias (COMM/, facturas, pagos)
+        host = config['db_host']
+        if host and not host.startswith('/') and host not in LOCAL_DB_HOSTS:
+            raise unittest.SkipTest(f"Pruebas de rendimiento solo contra un PostgreSQL local (servidor: {host}).")
+        super().setUpClass()
+        cls.env.user.group_ids |= cls.env.ref('om_advanced_commission.group_commission_manager')
+        cls.other_currency = cls.setup_other_currency('EUR')
+        cls.today = fields.Date.context_today(cls.env.user)
+
+        roles = ['internal', 'architect', 'construction', 'referrer']
+        cls.commissioners = cls.env['res.partner'].create([
+            {'name': f"Comisionista {index}"} for index in range(cls.RULE_COUNT)
+        ])
+        product = cls.env['product.product'].create({
+            'name': 'Servicio Comisionable',
+            'type': 'service',
+            'invoice_policy': 'order',
+            'list_price': 1000.0,
+        })
+        cls.orders = cls.env['sale.order'].create([{
+            'partner_id': cls.partner_a.id,
+            'seller1_percent': 0.0,
+            'order_line': [
+                (0, 0, {'product_id': product.id, 'product_uom_qty': 1, 'price_unit': 1000.0 + index}),
+                (0, 0, {'product_id': product.id, 'product_uom_qty': 2, 'price_unit': 250.0}),
+            ],
+            'commission_rule_ids': [(0, 0, {
+                'partner_id': partner.id,
+                'role_type': roles[rule_index % len(roles)],
+                'calculation_base': 'amount_untaxed',
+                'percent': 0.5,
+            }) for rule_index, partner in enumerate(cls.commissioners)],
+        } for index in range(cls.ORDER_COUNT)])
+        cls.orders.action_confirm()
+        cls.invoices = cls.orders._create_invoices()
+        cls.invoices.action_post()
+
+        company = cls.env.company
+        installment = 0
+        for invoice in cls.invoices:
+            amount = invoice.amount_residual / cls.INSTALLMENT_COUNT
+            for _index in range(cls.INSTALLMENT_COUNT):
+                currency, amount_paid = company.currency_id, amount
+                if installment % 2:
+                    currency = cls.other_currency
+                    amount_paid = company.currency_id._convert(amount, currency, company, cls.today)
+                cls.env['account.payment.register'].with_context(
+                    active_model='account.move', active_ids=invoice.ids,
+                ).create({
+                    'amount': amount_paid,
+                    'currency_id': currency.id,
+                    'payment_date': cls.today,
+                })._create_payments()
+                installment += 1
+
+        cls.partials = cls.invoices.line_ids.matched_credit_ids
+        # Comisiones generadas al registrar los pagos: el resultado esperado de cada escenario
+        cls.expected_move_count = cls.env['commission.move'].search_count([('sale_order_id', 'in', cls.orders.ids)])
+        cls.env['ir.config_parameter'].sudo().set_param(
+            'om_advanced_commission.default_commission_product_id', cls.product_b.id)
+        cls.env['ir.config_parameter'].sudo().set_param(
+            'om_advanced_commission.default_commission_journal_id', cls.company_data['default_journal_purchase'].id)
+
+    def _commission_moves(self):
+        return self.env['commission.move'].search([('sale_order_id', 'in', self.orders.ids)])
+
+    def _settle(self):
+        wizard = self.env['commission.make.invoice'].create({
+            'date_to': self.today,
+            'partner_ids': [(6, 0, self.commissioners.ids)],
+        })
+        return wizard._settle_moves(wizard._get_move_domain())
+
+    def test_scenario(self):
+        # Una comisión por orden, regla y parcialidad: sin ello el resto compara contra cero
+        self.assertEqual(self.expected_move_count, self.ORDER_COUNT * self.RULE_COUNT * self.INSTALLMENT_COUNT)
+
+    def test_generation(self):
+        self._commission_moves().unlink()
+        partials = self.partials.with_context(commission_raise_errors=True)
+        self.env.invalidate_all()
+        with self.assertQueryCount(self.QUERY_BASELINES['generation']):
+            moves = partials._create_commission_moves()
+        self.assertEqual(len(moves), self.expected_move_count)
+
+    def test_recalc(self):
+        self._commission_moves().unlink()
+        self.env.invalidate_all()
+        with self.assertQueryCount(self.QUERY_BASELINES['recalc']):
+            results = self.orders._recalc_commissions_batch()
+        self.assertEqual(sum(r['created'] for r in results), self.expected_move_count)
+
+    def test_settlement(self):
+        self.env.invalidate_all()
+        with self.assertQueryCount(self.QUERY_BASELINES['settlement']):
+            settlements, move_count = self._settle()
+        self.assertEqual(len(settlements), self.RULE_COUNT)
+        self.assertEqual(move_count, self.expected_move_count)
+
+    def test_bill(self):
+        settlements, _move_count = self._settle()
+        settlements.action_approve()
+        self.env.invalidate_all()
+        with self.assertQueryCount(self.QUERY_BASELINES['bill']):
+            bills = settlements._create_bills()
+        self.assertEqual(len(bills), len(settlements))
+        self.assertEqual(set(settlements.mapped('state')), {'invoiced'})
+
+    def test_report(self):
+        ReportModel = self.env['report.om_advanced_commission.report_commission_document']
+        self.env.invalidate_all()
+        with self.assertQueryCount(self.QUERY_BASELINES['report']):
+            values = ReportModel._get_report_values([], data={
+                'date_from': self.today,
+                'date_to': self.today,
+                'partner_ids': self.commissioners.ids,
+            })
+        self.assertEqual(len(values['docs']), self.RULE_COUNT)
+        self.assertEqual(sum(len(doc['moves']) for doc in values['docs']), self.expected_move_count)
+
+    def test_export(self):
+        wizard = self.env['commission.report.wizard'].create({
+            'date_from': self.today,
+            'date_to': self.today,
+            'partner_ids': [(6, 0, self.commissioners.ids)],
+            'output_format': 'csv',
+        })
+        ReportModel = self.env['report.om_advanced_commission.report_commission_document']
+        domain = ReportModel._get_report_domain(self.today, self.today, self.commissioners.ids)
+        stream = io.BytesIO()
+        self.env.invalidate_all()
+        with self.assertQueryCount(self.QUERY_BASELINES['export']):
+            wizard._export_csv(domain, stream)
+        # Encabezado más una fila por movimiento
+        self.assertEqual(len(stream.getvalue().splitlines()), self.expected_move_count + 1)
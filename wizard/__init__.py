@@ -1,3 +1,4 @@
 from . import commission_make_invoice
 from . import commission_report_wizard
-from . import commission_authorization_reject_wizard
\ No newline at end of file
+from . import commission_authorization_reject_wizard
+from . import commission_recalc_wizard
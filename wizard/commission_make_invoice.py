@@ -1,4 +1,10 @@
 from odoo import models, fields, api
+import logging
+import time
+
+from ..models.commission_perf import CommissionProfiler
+
+_logger = logging.getLogger(__name__)
 
 
 class CommissionMakeInvoice(models.TransientModel):
@@ -8,42 +14,125 @@ class CommissionMakeInvoice(models.TransientModel):
     date_to = fields.Date(string='Hasta fecha', default=fields.Date.context_today)
     partner_ids = fields.Many2many('res.partner', string='Comisionistas')
 
-    def action_generate_settlements(self):
-        Move = self.env['commission.move']
-        Settlement = self.env['commission.settlement']
-
+    def _get_move_domain(self):
         domain = [('state', '=', 'draft'), ('date', '<=', self.date_to)]
         if self.partner_ids:
             domain.append(('partner_id', 'in', self.partner_ids.ids))
+        return domain
+
+    @api.model
+    def _settle_moves(self, domain):
+        """Liquida en bloque los movimientos draft del dominio.
+
+        Agrupa en SQL por (partner, moneda, compañía), crea todas las
+        liquidaciones en un solo create y asigna settlement_id/state con un
+        único UPDATE. Devuelve (liquidaciones, nº de movimientos).
+        """
+        with CommissionProfiler(self.env, 'settlement') as profiler:
+            return self._settle_moves_profiled(domain, profiler)
+
+    @api.model
+    def _settle_moves_profiled(self, domain, profiler):
+        Move = self.env['commission.move']
+        Settlement = self.env['commission.settlement']
+
+        with profiler.phase('grouping'):
+            groups = Move._read_group(
+                domain, ['partner_id', 'currency_id', 'company_id'], ['id:array_agg'],
+            )
+        if not groups:
+            return Settlement, 0
 
-        moves = Move.search(domain)
-
-        # Agrupar por (partner_id, currency_id, company_id) usando IDs
-        grouped = {}
-        for m in moves:
-            key = (m.partner_id.id, m.currency_id.id, m.company_id.id)
-            if key not in grouped:
-                grouped[key] = self.env['commission.move']
-            grouped[key] |= m
-
-        created_settlements = Settlement
-        for (partner_id, currency_id, company_id), partner_moves in grouped.items():
-            partner = self.env['res.partner'].browse(partner_id)
-            settlement = Settlement.create({
-                'partner_id': partner_id,
-                'currency_id': currency_id,
-                'company_id': company_id,
-                'name': f"LIQ-{fields.Date.today()}-{partner.name}",
+        today = fields.Date.today()
+        with profiler.phase('insert'):
+            settlements = Settlement.create([{
+                'partner_id': partner.id,
+                'currency_id': currency.id,
+                'company_id': company.id,
+                'name': f"LIQ-{today}-{partner.name}",
                 'state': 'draft',
-                'move_ids': [(6, 0, partner_moves.ids)],
-            })
-            partner_moves.write({'state': 'settled'})
-            created_settlements |= settlement
+            } for partner, currency, company, _move_ids in groups])
+
+        move_ids, settlement_ids = [], []
+        for settlement, (_partner, _currency, _company, ids) in zip(settlements, groups):
+            move_ids.extend(ids)
+            settlement_ids.extend([settlement.id] * len(ids))
+
+        profiler.records = len(move_ids)
+        with profiler.phase('assign'):
+            moves = self._assign_settlements(move_ids, settlement_ids, settlements)
+        # Otra liquidación concurrente pudo tomar todos los movimientos de un grupo
+        empty = settlements - moves.settlement_id
+        if empty:
+            empty.unlink()
+            settlements -= empty
+        profiler.rows = len(settlements)
+        return settlements, len(moves)
+
+    @api.model
+    def _assign_settlements(self, move_ids, settlement_ids, settlements):
+        """Asigna los movimientos a sus liquidaciones y devuelve los realmente asignados.
+
+        El UPDATE solo toma movimientos que siguen en draft: si el asistente
+        manual y la ejecución en segundo plano seleccionaron los mismos, el
+        segundo no los mueve a otra liquidación (no se liquida dos veces).
+        """
+        Move = self.env['commission.move']
+        Move.flush_model(['settlement_id', 'state'])
+        self.env.cr.execute("""
+            UPDATE commission_move m
+               SET settlement_id = v.settlement_id,
+                   state = 'settled',
+                   write_uid = %s,
+                   write_date = now() at time zone 'UTC'
+              FROM unnest(%s::int[], %s::int[]) AS v(move_id, settlement_id)
+             WHERE m.id = v.move_id
+               AND m.state = 'draft'
+         RETURNING m.id
+        """, [self.env.uid, move_ids, settlement_ids])
+        moves = Move.browse([row[0] for row in self.env.cr.fetchall()])
+
+        # Refrescar caché y disparar recomputos (total_amount de las liquidaciones)
+        # solo con los movimientos que cambió el UPDATE
+        Move.browse(move_ids).invalidate_recordset(['settlement_id', 'state'])
+        settlements.invalidate_recordset(['move_ids'])
+        moves.modified(['settlement_id', 'state'])
+
+        # El UPDATE directo no pasa por write(): el saldo se ajusta aquí, solo
+        # con las filas cambiadas, que pasaron todas de draft a settled
+        deltas = moves._balance_deltas()
+        for values in deltas.values():
+            values['amount_accrued'] -= values['amount_settled']
+        self.env['commission.balance']._apply_deltas(deltas)
+        return moves
+
+    def action_generate_settlements(self):
+        start = time.perf_counter()
+        created_settlements, move_count = self._settle_moves(self._get_move_domain())
+        elapsed = time.perf_counter() - start
+        _logger.info(
+            "[COMM] liquidación masiva: %s movimientos en %s liquidaciones (%.2fs)",
+            move_count, len(created_settlements), elapsed,
+        )
 
         return {
             'type': 'ir.actions.act_window',
-            'name': 'Liquidaciones Generadas',
+            'name': f'Liquidaciones Generadas ({move_count} movimientos en {elapsed:.1f}s)',
             'res_model': 'commission.settlement',
             'view_mode': 'list,form',
             'domain': [('id', 'in', created_settlements.ids)],
-        }
\ No newline at end of file
+        }
+
+    def action_launch_run(self):
+        """Lanza la liquidación como ejecución en segundo plano (cron)."""
+        run = self.env['commission.settlement.run'].create({
+            'date_to': self.date_to,
+            'partner_ids': [(6, 0, self.partner_ids.ids)],
+        })
+        run.action_start()
+        return {
+            'type': 'ir.actions.act_window',
+            'res_model': 'commission.settlement.run',
+            'res_id': run.id,
+            'view_mode': 'form',
+        }
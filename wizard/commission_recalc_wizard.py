@@ -0,0 +1,41 @@
+from odoo import models, fields, api
+from odoo.exceptions import UserError
+from odoo.tools.safe_eval import safe_eval
+
+
+class CommissionRecalcWizard(models.TransientModel):
+    _name = 'commission.recalc.wizard'
+    _description = 'Asistente de Recálculo Masivo de Comisiones'
+
+    order_ids = fields.Many2many('sale.order', string='Órdenes Seleccionadas')
+    order_domain = fields.Char(string='Dominio de Órdenes', default="[('state', '=', 'sale')]",
+                               help='Se usa cuando no hay órdenes seleccionadas.')
+    partition_size = fields.Integer(string='Órdenes por Partición', default=200)
+
+    @api.model
+    def default_get(self, fields_list):
+        res = super().default_get(fields_list)
+        if self.env.context.get('active_model') == 'sale.order' and self.env.context.get('active_ids'):
+            res['order_ids'] = [(6, 0, self.env.context['active_ids'])]
+        return res
+
+    def action_launch(self):
+        self.ensure_one()
+        if self.partition_size <= 0:
+            raise UserError("El tamaño de partición debe ser mayor que cero.")
+
+        domain = False
+        orders = self.order_ids
+        if not orders:
+            domain = self.order_domain or '[]'
+            orders = self.env['sale.order'].search(safe_eval(domain))
+        if not orders:
+            raise UserError("No hay órdenes de venta que recalcular.")
+
+        job = self.env['commission.recalc.job']._launch(orders, self.partition_size, domain)
+        return {
+            'type': 'ir.actions.act_window',
+            'res_model': 'commission.recalc.job',
+            'res_id': job.id,
+            'view_mode': 'form',
+        }
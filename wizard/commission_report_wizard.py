@@ -1,6 +1,24 @@
 from odoo import models, fields, api
 from odoo.exceptions import UserError
+from odoo.tools.misc import xlsxwriter
 from datetime import date
+import base64
+import csv
+import io
+import tempfile
+import zipfile
+
+from ..report.commission_report import REPORT_PARTNER_CHUNK
+
+# Por encima de este número de movimientos se genera un PDF por bloque de comisionistas
+REPORT_SPLIT_THRESHOLD = 20000
+# Filas leídas por bloque al exportar a CSV/XLSX
+EXPORT_CHUNK = 2000
+
+EXPORT_HEADERS = [
+    'Comisionista', 'Folio', 'Fecha Factura', 'Razón Social', 'Job Name', 'Fecha Pago',
+    'Factura', '$ Fact. (sin IVA)', '% Comisión', 'Monto Comisión', 'Estado',
+]
 
 
 class CommissionReportWizard(models.TransientModel):
@@ -12,6 +30,11 @@ class CommissionReportWizard(models.TransientModel):
     partner_ids = fields.Many2many('res.partner', string='Vendedores',
                                    help="Dejar vacío para imprimir todos")
     allow_previous_months = fields.Boolean(string='Ver meses anteriores', default=False)
+    output_format = fields.Selection([
+        ('pdf', 'PDF'),
+        ('csv', 'CSV'),
+        ('xlsx', 'Excel (XLSX)'),
+    ], string='Formato', default='pdf', required=True)
 
     @api.model
     def default_get(self, fields_list):
@@ -41,7 +64,7 @@ class CommissionReportWizard(models.TransientModel):
                 if rec.date_to and rec.date_to > today:
                     raise UserError("La fecha 'Hasta' no puede ser mayor a hoy.")
 
-    def action_print_report(self):
+    def _check_partner_access(self):
         if not self.env.user.has_group('om_advanced_commission.group_commission_authorizer'):
             partner = self.env.user.partner_id
             if self.partner_ids and partner not in self.partner_ids:
@@ -49,9 +72,126 @@ class CommissionReportWizard(models.TransientModel):
             if not self.partner_ids:
                 self.partner_ids = [(6, 0, [partner.id])]
 
+    def action_print_report(self):
+        self._check_partner_access()
+        if self.output_format != 'pdf':
+            return self.action_export()
+
         data = {
             'date_from': self.date_from,
             'date_to': self.date_to,
             'partner_ids': self.partner_ids.ids,
         }
-        return self.env.ref('om_advanced_commission.action_report_commission_pdf').report_action(self, data=data)
\ No newline at end of file
+        report = self.env.ref('om_advanced_commission.action_report_commission_pdf')
+        ReportModel = self.env['report.om_advanced_commission.report_commission_document']
+        domain = ReportModel._get_report_domain(self.date_from, self.date_to, self.partner_ids.ids)
+        if self.env['commission.move'].search_count(domain) > REPORT_SPLIT_THRESHOLD:
+            return self._print_report_split(report, ReportModel, domain, data)
+        return report.report_action(self, data=data)
+
+    def _print_report_split(self, report, ReportModel, domain, data):
+        """Rangos muy grandes: un PDF por bloque de comisionistas, empaquetados en un ZIP."""
+        partner_ids = list(ReportModel._get_partner_totals(domain))
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+            for index, start in enumerate(range(0, len(partner_ids), REPORT_PARTNER_CHUNK), start=1):
+                chunk_data = dict(data, partner_ids=partner_ids[start:start + REPORT_PARTNER_CHUNK])
+                pdf, _report_type = report._render_qweb_pdf(report.report_name, res_ids=self.ids, data=chunk_data)
+                archive.writestr(f"comisiones_{self.date_from}_{self.date_to}_{index:03d}.pdf", pdf)
+                self.env.invalidate_all()
+
+        attachment = self.env['ir.attachment'].create({
+            'name': f"Comisiones {self.date_from} - {self.date_to}.zip",
+            'datas': base64.b64encode(buffer.getvalue()),
+            'mimetype': 'application/zip',
+            'res_model': self._name,
+            'res_id': self.id,
+        })
+        return {
+            'type': 'ir.actions.act_url',
+            'url': f"/web/content/{attachment.id}?download=true",
+            'target': 'self',
+        }
+
+    def _iter_export_rows(self, domain):
+        """Genera las filas del dominio por bloques (paginación por id).
+
+        Cada bloque se convierte en filas planas y se libera la caché del ORM,
+        así la memoria no crece con el número de movimientos.
+        """
+        Move = self.env['commission.move']
+        ReportModel = self.env['report.om_advanced_commission.report_commission_document']
+        state_labels = dict(Move._fields['state']._description_selection(self.env))
+        last_id = 0
+        while True:
+            moves = Move.search(domain + [('id', '>', last_id)], order='id', limit=EXPORT_CHUNK)
+            if not moves:
+                break
+            last_id = moves[-1].id
+            for row in ReportModel._get_move_rows([('id', 'in', moves.ids)]):
+                yield [
+                    row['partner_name'], row['so_name'], row['invoice_date'] or '', row['customer_name'],
+                    row['project_name'] or '', row['payment_date'] or '', row['invoice_name'] or '',
+                    row['base_amount_paid'], row['percent'] if row['percent'] is not False else '',
+                    row['amount'], state_labels.get(row['state'], ''),
+                ]
+            self.env.invalidate_all()
+
+    def _export_csv(self, domain, stream):
+        text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+        writer = csv.writer(text)
+        writer.writerow(EXPORT_HEADERS)
+        for row in self._iter_export_rows(domain):
+            writer.writerow(row)
+        text.flush()
+        text.detach()
+
+    def _export_xlsx(self, domain, stream):
+        # constant_memory: cada fila se escribe a disco en cuanto se completa
+        workbook = xlsxwriter.Workbook(stream, {'constant_memory': True, 'in_memory': False})
+        sheet = workbook.add_worksheet('Comisiones')
+        date_format = workbook.add_format({'num_format': 'yyyy-mm-dd'})
+        money_format = workbook.add_format({'num_format': '#,##0.00'})
+        sheet.write_row(0, 0, EXPORT_HEADERS, workbook.add_format({'bold': True}))
+        for row_index, row in enumerate(self._iter_export_rows(domain), start=1):
+            for col, value in enumerate(row):
+                if col in (2, 5) and value:
+                    sheet.write_datetime(row_index, col, value, date_format)
+                elif col in (7, 9):
+                    sheet.write_number(row_index, col, value, money_format)
+                else:
+                    sheet.write(row_index, col, value)
+        workbook.close()
+
+    def _export_stream(self):
+        """Genera la exportación en un archivo temporal y lo devuelve abierto.
+
+        Devuelve (archivo, tipo MIME, nombre); quien lo recibe debe cerrarlo.
+        """
+        self.ensure_one()
+        self._check_partner_access()
+        ReportModel = self.env['report.om_advanced_commission.report_commission_document']
+        domain = ReportModel._get_report_domain(self.date_from, self.date_to, self.partner_ids.ids)
+
+        stream = tempfile.TemporaryFile()
+        try:
+            if self.output_format == 'xlsx':
+                self._export_xlsx(domain, stream)
+                mimetype = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+            else:
+                self._export_csv(domain, stream)
+                mimetype = 'text/csv'
+        except Exception:
+            stream.close()
+            raise
+        stream.seek(0)
+        return stream, mimetype, f"Comisiones {self.date_from} - {self.date_to}.{self.output_format}"
+
+    def action_export(self):
+        self._check_partner_access()
+        # El controlador envía el archivo temporal por bloques, sin pasar por ir.attachment
+        return {
+            'type': 'ir.actions.act_url',
+            'url': f"/om_advanced_commission/export/{self.id}",
+            'target': 'self',
+        }